@@ -1,68 +1,814 @@
+import os
 import random
+import signal
+import sys
+import threading
+import time
+from multiprocessing import Pool
+import ChessBook, ChessEval, ChessTablebase
 
-pieceScore = {'K': 0, 'Q': 9, 'R': 5, 'B': 3, 'N': 3, 'p': 1}
-
-knightScores = [[1, 1, 1, 1, 1, 1, 1, 1],
-                [1, 2, 2, 2, 2, 2, 2, 1],
-                [1, 2, 3, 3, 3, 3, 2, 1],
-                [1, 2, 3, 4, 4, 3, 2, 1],
-                [1, 2, 3, 4, 4, 3, 2, 1],
-                [1, 2, 3, 3, 3, 3, 2, 1],
-                [1, 2, 2, 2, 2, 2, 2, 1],
-                [1, 1, 1, 1, 1, 1, 1, 1]]
-
-bishopScores = [[4, 3, 2, 1, 1, 2, 3, 4],
-                [3, 4, 3, 2, 2, 3, 4, 3],
-                [2, 3, 4, 3, 3, 4, 3, 2],
-                [1, 2, 3, 4, 4, 3, 2, 1],
-                [1, 2, 3, 4, 4, 3, 2, 1],
-                [2, 3, 4, 3, 3, 4, 3, 2],
-                [3, 4, 3, 2, 2, 3, 4, 3],
-                [4, 3, 2, 1, 1, 2, 3, 4]]
-
-queenScores = [[1, 1, 1, 3, 1, 1, 1, 1],
-                [1, 2, 3, 3, 3, 1, 1, 1],
-                [1, 4, 3, 3, 3, 4, 2, 1],
-                [1, 2, 3, 3, 3, 2, 2, 1],
-                [1, 2, 3, 3, 3, 2, 2, 1],
-                [1, 3, 3, 3, 3, 4, 2, 1],
-                [1, 1, 2, 3, 3, 1, 1, 1],
-                [1, 1, 1, 3, 1, 1, 1, 1]]
-
-# rook is better on open files, connected rooks or with queen
-rookScores = [[4, 3, 4, 4, 4, 4, 3, 4],
-                [4, 4, 4, 4, 4, 4, 4, 4],
-                [1, 1, 2, 3, 3, 2, 1, 1],
-                [1, 2, 3, 3, 3, 3, 2, 1],
-                [1, 2, 3, 3, 3, 3, 2, 1],
-                [1, 1, 2, 3, 3, 2, 1, 1],
-                [4, 4, 4, 4, 4, 4, 4, 4],
-                [4, 3, 4, 4, 4, 4, 3, 4]]
-
-whitePawnScores = [[10, 10, 10, 10, 10, 10, 10, 10],
-                [8, 8, 8, 8, 8, 8, 8, 8],
-                [5, 6, 6, 7, 7, 6, 6, 5],
-                [2, 3, 3, 4, 4, 3, 3, 2],
-                [1, 2, 3, 4, 4, 3, 2, 1],
-                [1, 1, 2, 3, 3, 2, 1, 1],
-                [1, 1, 1, 0, 0, 1, 1, 1],
-                [0, 0, 0, 0, 0, 0, 0, 0]]
-
-blackPawnScores = [[0, 0, 0, 0, 0, 0, 0, 0],
-                [1, 1, 1, 0, 0, 1, 1, 1],
-                [1, 1, 2, 3, 3, 2, 1, 1],
-                [1, 2, 3, 4, 4, 3, 2, 1],
-                [2, 3, 3, 4, 4, 3, 3, 2],
-                [5, 6, 6, 7, 7, 6, 6, 5],
-                [8, 8, 8, 8, 8, 8, 8, 8],
-                [10, 10, 10, 10, 10, 10, 10, 10]]
-
-piecePositionScores = {'N': knightScores, 'Q': queenScores, 'B': bishopScores, "R": rookScores, "bp": blackPawnScores, "wp": whitePawnScores}
-
-CHECKMATE = 1000 # high score for checkmate
+pieceScore = ChessEval.pieceScore # read by quiescence for every capture, so kept at hand
+
+CHECKMATE = 1000 # high score for checkmate, the search takes off a point per ply so a quicker mate scores higher
 STALEMATE = 0
-DEPTH = 2
+MAX_DEPTH = 64 # iterative deepening stops here if the budget hasn't run out before
+MATE_THRESHOLD = CHECKMATE - 2 * MAX_DEPTH # scores beyond this are mates, CHECKMATE minus the plies to the mate
+TABLEBASE_WIN_CP = 10000 # centipawns reported for a tablebase win, clearly won but below any GUI's mate scores
+TIME_LIMIT = 2.0 # seconds per AI move
+# depths a search finishes within a time limit (seconds, depth), measured in the slower middlegames. A cached result
+# that deep is as good as what a search with that limit would find. Every further ply takes about DEPTH_TIME_FACTOR as long
+TIME_LIMIT_DEPTHS = ((0.05, 2), (0.15, 3), (0.4, 4), (1.1, 5), (2.7, 6), (6, 7))
+DEPTH_TIME_FACTOR = 2.5
+LIMIT_CHECK_INTERVAL = 1024 # nodes between two looks at the clock
+DELTA_MARGIN = 2 # quiescence skips captures that can't bring the score within this of alpha
+PVS_WINDOW = 0.01 # width of a null window, scores are multiples of 0.1 so none falls strictly inside one
+ASPIRATION_WINDOWS = (0.5, 2) # half widths tried around the score of the last depth before a full window
+NULL_MOVE_REDUCTION = 2 # extra plies taken off the search after passing the turn
+NULL_MOVE_MIN_DEPTH = 3
+LMR_MIN_DEPTH = 3 # late move reductions only where there is this much depth left
+LMR_FULL_DEPTH_MOVES = 3 # moves searched to full depth before the later quiet ones are reduced by a ply
+WORKERS = os.cpu_count() or 1 # processes used by Searcher.searchParallel
+BOOK_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "book.bin") # Polyglot opening book, used when it exists
+TABLEBASE_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "syzygy") # Syzygy endgame tables, used when it exists
+
+# bound types of a transposition table score
+EXACT = 0
+LOWERBOUND = 1 # the search failed high, the real score is at least this
+UPPERBOUND = 2 # the search failed low, the real score is at most this
+TRANSPOSITION_TABLE_SIZE = 1 << 20
+
+
+class TranspositionTable:
+    '''Fixed-size table of search results indexed by the position's zobrist key.
+    When two positions land on the same slot the one searched to the greater depth is kept.'''
+    def __init__(self, size=TRANSPOSITION_TABLE_SIZE):
+        self.size = size
+        self.entries = [None] * size # (key, depth, score, bound, bestMove)
+
+    def probe(self, key):
+        '''The entry stored for key, or None'''
+        entry = self.entries[key % self.size]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+    def store(self, key, depth, score, bound, bestMove):
+        index = key % self.size
+        entry = self.entries[index]
+        if entry is None or entry[0] == key or depth >= entry[1]:
+            self.entries[index] = (key, depth, score, bound, bestMove)
+
+    def clear(self):
+        self.entries = [None] * self.size
+
+
+
+# move ordering scores, every capture is tried before the killers and every killer before the other quiet moves
+HASH_MOVE_SCORE = 1 << 30
+CAPTURE_SCORE = 1 << 25
+KILLER_SCORE = 1 << 20
+HISTORY_LIMIT = KILLER_SCORE // 2 # history scores are halved when one gets this big
+mvvLvaValues = {'p': 1, 'N': 2, 'B': 3, 'R': 4, 'Q': 5, 'K': 6}
+
+
+class MoveOrderer:
+    '''Sorts the moves of a node so that the ones most likely to cause a cutoff are searched first:
+    the transposition table move, then captures by MVV-LVA (most valuable victim, least valuable attacker),
+    then the killer moves of the ply, then the remaining quiet moves by their history score.
+    Give a Searcher a subclass to plug in another ordering.'''
+    def __init__(self, maxPly=MAX_DEPTH + 1):
+        self.killers = [[None, None] for _ in range(maxPly)] # the last two quiet moves that caused a cutoff at each ply
+        self.history = {} # (pieceMoved, endRow, endColumn) -> how much quiet cutoffs this move caused
+
+    def newSearch(self):
+        '''Forget the killers of the last search and age its history'''
+        for killers in self.killers:
+            killers[0] = killers[1] = None
+        self.ageHistory()
+
+    def clear(self):
+        '''Forget the killers and the history, for a new game'''
+        self.newSearch()
+        self.history.clear()
+
+    def ageHistory(self):
+        for key in self.history:
+            self.history[key] //= 2
+
+    def scoreMove(self, move, hashMove, ply):
+        if hashMove is not None and move == hashMove:
+            return HASH_MOVE_SCORE
+        if move.isCapture:
+            return CAPTURE_SCORE + 10 * mvvLvaValues[move.pieceCaptured[1]] - mvvLvaValues[move.pieceMoved[1]]
+        if move.pawnPromotion:
+            return CAPTURE_SCORE + mvvLvaValues[move.promotionPiece]
+        if ply < len(self.killers):
+            killers = self.killers[ply]
+            if move == killers[0]:
+                return KILLER_SCORE + 1
+            if move == killers[1]:
+                return KILLER_SCORE
+        return self.history.get((move.pieceMoved, move.endRow, move.endColumn), 0)
+
+    def orderMoves(self, moves, hashMove, ply):
+        '''Sort moves in place, best first. The sort is stable, so equally scored moves keep their order'''
+        moves.sort(key=lambda move: self.scoreMove(move, hashMove, ply), reverse=True)
+
+    def stagedMoves(self, gs, hashMove, ply):
+        '''The moves of gs in the same order, but generated stage by stage by gs.getStagedMoves as the search asks for them'''
+        killers = self.killers[ply] if ply < len(self.killers) else ()
+        return gs.getStagedMoves(hashMove, killers, lambda move: self.scoreMove(move, None, ply))
+
+    def recordCutoff(self, move, depth, ply):
+        '''Called when move caused a beta cutoff at ply with depth left to search'''
+        if move.isCapture or move.pawnPromotion: # these are ordered well enough already
+            return
+        if ply < len(self.killers):
+            killers = self.killers[ply]
+            if move != killers[0]:
+                killers[1] = killers[0]
+                killers[0] = move
+        key = (move.pieceMoved, move.endRow, move.endColumn)
+        self.history[key] = self.history.get(key, 0) + depth * depth
+        if self.history[key] >= HISTORY_LIMIT:
+            self.ageHistory()
+
+
+# shared by the searchers made by findBestMove and findBestMoveParallel, they are only read from
+openingBook = ChessBook.OpeningBook(BOOK_FILE) if os.path.exists(BOOK_FILE) else None
+tablebase = ChessTablebase.openTablebase(TABLEBASE_DIRECTORY)
+
+
+class SearchTimeout(Exception):
+    '''Raised from inside the search when the time or node budget has run out'''
+
+class SearchStats:
+    '''Counters and timers of one search. Only collected when findBestMove is given one, so an ordinary search pays
+    nothing but a few "is None" tests for them'''
+    def __init__(self):
+        self.nodes = 0 # alpha-beta nodes
+        self.quiescenceNodes = 0
+        self.transpositionHits = 0 # probes that found the position
+        self.transpositionCutoffs = 0 # hits whose score could be returned right away
+        self.cutoffs = 0 # beta cutoffs
+        self.firstMoveCutoffs = 0 # beta cutoffs by the first move searched, a measure of move ordering
+        self.nullMoveCutoffs = 0 # nodes cut off because even passing the turn was good enough
+        self.researches = 0 # null window or reduced searches that had to be repeated
+        self.depthNodes = [] # nodes of every finished depth
+        self.moveGenerationTime = 0.0
+        self.makeUndoTime = 0.0
+        self.evaluationTime = 0.0
+        self.totalTime = 0.0
+
+    def firstMoveCutoffRate(self):
+        return self.firstMoveCutoffs / self.cutoffs if self.cutoffs else 0.0
+
+    def branchingFactor(self):
+        '''Effective branching factor: how many times more nodes the last depth took than the one before'''
+        if len(self.depthNodes) < 2 or self.depthNodes[-2] == 0:
+            return 0.0
+        return self.depthNodes[-1] / self.depthNodes[-2]
+
+    def instrument(self, gs):
+        '''Time move generation and make/undo by shadowing the methods of this one game state'''
+        for name, timer in (("getValidMoves", "moveGenerationTime"), ("getCaptureMoves", "moveGenerationTime"), ("getQuietMoves", "moveGenerationTime"),
+                            ("getPieceMoves", "moveGenerationTime"), ("makeMove", "makeUndoTime"), ("undoMove", "makeUndoTime")):
+            setattr(gs, name, self.timed(getattr(gs, name), timer))
+
+    def uninstrument(self, gs):
+        for name in ("getValidMoves", "getCaptureMoves", "getQuietMoves", "getPieceMoves", "makeMove", "undoMove"):
+            gs.__dict__.pop(name, None)
+
+    def timed(self, method, timer):
+        def timedMethod(*args):
+            start = time.perf_counter()
+            result = method(*args)
+            setattr(self, timer, getattr(self, timer) + time.perf_counter() - start)
+            return result
+        return timedMethod
+
+    def report(self):
+        '''The numbers as readable lines'''
+        allNodes = self.nodes + self.quiescenceNodes
+        otherTime = self.totalTime - self.moveGenerationTime - self.makeUndoTime - self.evaluationTime
+        return ["nodes %d (quiescence %d, %.0f%%), %.0f nodes/s" % (allNodes, self.quiescenceNodes, 100 * self.quiescenceNodes / allNodes if allNodes else 0,
+                                                                 allNodes / self.totalTime if self.totalTime else 0),
+                "cutoffs %d, first move %.1f%%, tt hits %d, tt cutoffs %d" % (self.cutoffs, 100 * self.firstMoveCutoffRate(),
+                                                                              self.transpositionHits, self.transpositionCutoffs),
+                "null move cutoffs %d, re-searches %d" % (self.nullMoveCutoffs, self.researches),
+                "nodes per depth %s, branching factor %.2f" % (self.depthNodes, self.branchingFactor()),
+                "time %.3fs: move generation %.3fs, make/undo %.3fs, evaluation %.3fs, other %.3fs" % (self.totalTime,
+                    self.moveGenerationTime, self.makeUndoTime, self.evaluationTime, otherTime)]
+
+class SearchResult:
+    '''What a search found: the best move, its score for the side to move, the principal variation starting with the
+    move, the depth finished (0 for a book move or a search stopped before depth 1) and the nodes searched'''
+    def __init__(self, bestMove, score, pv, depth, nodes):
+        self.bestMove = bestMove
+        self.score = score
+        self.pv = pv
+        self.depth = depth
+        self.nodes = nodes
+
+    def toTuple(self):
+        '''(depth, score, principal variation, nodes), the form put on the return queue'''
+        return self.depth, self.score, self.pv, self.nodes
+
+
+class Searcher:
+    '''A search engine that owns everything a search changes: the transposition table, the move ordering, the budget
+    and counters of the running search and its result. Searchers share nothing, so one process can run many of them,
+    say one per game, each on its own thread. A searcher runs one search at a time.
+    The opening book, tablebase and analysis cache are optional. Books and tablebases are only read, so one may
+    be given to many searchers; an analysis cache is a database connection and belongs to one searcher.'''
+    def __init__(self, openingBook=None, tablebase=None, analysisCache=None, moveOrderer=None, tableSize=TRANSPOSITION_TABLE_SIZE):
+        self.openingBook = openingBook
+        self.tablebase = tablebase
+        self.analysisCache = analysisCache
+        self.transpositionTable = TranspositionTable(tableSize)
+        self.moveOrderer = moveOrderer if moveOrderer is not None else MoveOrderer()
+        # budget of the running search, set up by search
+        self.deadline = None
+        self.nodeLimit = None
+        self.stopEvent = None # threading.Event another thread can set to stop the search early
+        self.ponderHitEvent = None # set when the pondered move was played, the clock starts then
+        self.ponderTime = None # time limit that starts on the ponder hit
+        self.ponderDeadline = None # end of that time limit once a root move search of searchParallel has seen the hit
+        self.nodeCount = 0
+        self.stats = None # SearchStats being filled in, if any
+        self.rootMove = None # best move the root has found so far at the depth being searched
+        self.moveBuffers = [] # one move list per ply, reused by every node at that ply instead of making new lists
+
+    def newGame(self):
+        '''Forget what was learned in earlier games'''
+        self.transpositionTable.clear()
+        self.moveOrderer.clear()
+
+    def search(self, gs, validMoves=None, returnQueue=None, timeLimit=TIME_LIMIT, nodeLimit=None, maxDepth=MAX_DEPTH,
+               stopEvent=None, stats=None, ponderHitEvent=None):
+        '''Iterative deepening: search depth 1, 2, 3, ... until the time (seconds) or node budget runs out or stopEvent is set.
+        Returns the SearchResult of the deepest finished depth, None if gs has no valid moves. With a returnQueue the
+        result of every finished depth is also put on it as (depth, score, principal variation, nodes), so the caller
+        always has the best move found so far at hand.
+        A SearchStats passed as stats is filled in with the counters and timings of the search.
+        With a ponderHitEvent the search ponders: it runs without a time limit, on the opponent's time, until the event is
+        set because the opponent played the expected move. Then timeLimit starts. On a miss, set stopEvent instead.'''
+        if validMoves is None:
+            validMoves = gs.getValidMoves()
+        if stats is None:
+            return self.searchIteratively(gs, validMoves, returnQueue, timeLimit, nodeLimit, maxDepth, stopEvent, ponderHitEvent)
+        self.stats = stats
+        stats.instrument(gs)
+        start = time.perf_counter()
+        try:
+            return self.searchIteratively(gs, validMoves, returnQueue, timeLimit, nodeLimit, maxDepth, stopEvent, ponderHitEvent)
+        finally:
+            stats.totalTime += time.perf_counter() - start
+            stats.uninstrument(gs)
+            self.stats = None
+
+    def searchIteratively(self, gs, validMoves, returnQueue, timeLimit, nodeLimit, maxDepth, stopEvent, ponderHitEvent):
+        '''The body of search'''
+        random.shuffle(validMoves)
+        bookMove = self.findBookMove(gs, validMoves)
+        if bookMove is not None:
+            return self.report(returnQueue, SearchResult(bookMove, 0, [bookMove], 0, 0))
+        tablebaseResult = self.findTablebaseMove(gs, validMoves)
+        if tablebaseResult is not None:
+            return self.report(returnQueue, SearchResult(tablebaseResult[0], tablebaseResult[1], [tablebaseResult[0]], 1, 0))
+        cached = self.findCachedResult(gs, validMoves)
+        if cached is not None:
+            if self.isCachedResultFinal(cached, maxDepth, timeLimit):
+                return self.report(returnQueue, SearchResult(cached[3], cached[1], [cached[3]], cached[0], 0))
+            self.transpositionTable.store(gs.zobristKey, cached[0], cached[1], cached[2], cached[3]) # its move is searched first
+        if len(validMoves) == 0:
+            return None
+        self.nodeCount = 0
+        self.deadline = time.time() + timeLimit if timeLimit is not None else None
+        self.nodeLimit = nodeLimit
+        self.stopEvent = stopEvent
+        self.ponderHitEvent = None
+        if ponderHitEvent is not None and not ponderHitEvent.is_set(): # no clock until the ponder hit
+            self.deadline = None
+            self.ponderHitEvent, self.ponderTime = ponderHitEvent, timeLimit
+        movesMade = len(gs.moveLog)
+        result = SearchResult(validMoves[0], 0, [validMoves[0]], 0, 0)
+        self.moveOrderer.newSearch()
+        for depth in range(1, maxDepth + 1):
+            self.rootMove = None
+            depthStartNodes = self.nodeCount
+            try:
+                score = self.searchRoot(gs, validMoves, depth, result.score if result.depth != 0 else None)
+            except SearchTimeout:
+                while len(gs.moveLog) > movesMade: # the search was interrupted between makeMove and undoMove
+                    gs.undoMove()
+                break
+            if self.rootMove is None:
+                break
+            if self.stats is not None:
+                self.stats.depthNodes.append(self.nodeCount - depthStartNodes)
+            pv = self.getPrincipalVariation(gs, depth)
+            if len(pv) == 0 or pv[0] != self.rootMove:
+                pv = [self.rootMove]
+            result = self.report(returnQueue, SearchResult(self.rootMove, score, pv, depth, self.nodeCount))
+            if abs(score) >= ChessTablebase.TABLEBASE_WIN: # forced mate or tablebase result found, deeper searches won't change it
+                break
+        if result.depth == 0:
+            result.nodes = self.nodeCount
+            self.report(returnQueue, result)
+        else:
+            self.storeCachedResult(gs, result.depth, result.score, result.bestMove)
+        return result
+
+    def report(self, returnQueue, result):
+        '''Put result on the return queue, if there is one, and return it'''
+        if returnQueue is not None:
+            returnQueue.put(result.toTuple())
+        return result
+
+    def searchRoot(self, gs, validMoves, depth, previousScore):
+        '''Search the root to depth, first with aspiration windows around previousScore, the score of the last depth.
+        A score that falls outside the window is only a bound, so the window is widened and the search repeated'''
+        turnMultiplier = 1 if gs.whiteToMove else -1
+        if previousScore is not None and abs(previousScore) < ChessTablebase.TABLEBASE_WIN:
+            for window in ASPIRATION_WINDOWS:
+                alpha, beta = previousScore - window, previousScore + window
+                score = self.findMoveNegaMaxAlphaBeta(gs, validMoves, depth, alpha, beta, turnMultiplier)
+                if alpha < score < beta:
+                    return score
+                if self.stats is not None:
+                    self.stats.researches += 1
+        return self.findMoveNegaMaxAlphaBeta(gs, validMoves, depth, -CHECKMATE, CHECKMATE, turnMultiplier)
+
+    def searchParallel(self, gs, validMoves=None, returnQueue=None, workers=WORKERS, timeLimit=TIME_LIMIT, nodeLimit=None, maxDepth=MAX_DEPTH,
+                       stopEvent=None, ponderHitEvent=None, pool=None):
+        '''Iterative deepening with the root moves shared out to a pool of worker processes at every depth, after
+        the most likely best one has been searched here. Every worker keeps its own transposition table from one depth
+        to the next. Reports and returns the same results as search, and stops and ponders the same way, but the
+        events must be multiprocessing.Events as the pool workers look at them too.
+        Without a RootPool as pool one is started for this search alone. A pool given replaces workers, and the
+        events have to be the ones it was made with'''
+        if validMoves is None:
+            validMoves = gs.getValidMoves()
+        if pool is not None:
+            workers = pool.workers
+        if workers <= 1 or len(validMoves) <= 1:
+            return self.search(gs, validMoves, returnQueue, timeLimit, nodeLimit, maxDepth, stopEvent, ponderHitEvent=ponderHitEvent)
+        bookMove = self.findBookMove(gs, validMoves)
+        if bookMove is not None:
+            return self.report(returnQueue, SearchResult(bookMove, 0, [bookMove], 0, 0))
+        tablebaseResult = self.findTablebaseMove(gs, validMoves)
+        if tablebaseResult is not None:
+            return self.report(returnQueue, SearchResult(tablebaseResult[0], tablebaseResult[1], [tablebaseResult[0]], 1, 0))
+        cached = self.findCachedResult(gs, validMoves)
+        if cached is not None and self.isCachedResultFinal(cached, maxDepth, timeLimit):
+            return self.report(returnQueue, SearchResult(cached[3], cached[1], [cached[3]], cached[0], 0))
+        ownPool = pool is None
+        if ownPool:
+            pool = RootPool(workers, self.tablebase is not None, stopEvent, ponderHitEvent)
+        # lets terminate() of the process running the search shut the pool down too. The handler of the caller is put back afterwards
+        previousHandler = None
+        if threading.current_thread() is threading.main_thread():
+            previousHandler = signal.getsignal(signal.SIGTERM)
+            signal.signal(signal.SIGTERM, lambda signalNumber, frame: sys.exit(0))
+        try:
+            result = self.searchRootMoves(gs, validMoves, returnQueue, pool, timeLimit, nodeLimit, maxDepth, stopEvent, ponderHitEvent,
+                                          cached[3] if cached is not None else None)
+        finally:
+            if ownPool:
+                pool.close()
+            if previousHandler is not None:
+                signal.signal(signal.SIGTERM, previousHandler)
+        if result.depth != 0:
+            self.storeCachedResult(gs, result.depth, result.score, result.bestMove)
+        return result
+
+    def searchRootMoves(self, gs, validMoves, returnQueue, pool, timeLimit, nodeLimit, maxDepth, stopEvent, ponderHitEvent, cachedMove):
+        '''The iterative deepening of searchParallel, the root moves of every depth searched as tasks of pool'''
+        random.shuffle(validMoves)
+        self.moveOrderer.orderMoves(validMoves, cachedMove, 0) # until the first depth has scored them
+        result = SearchResult(validMoves[0], 0, [validMoves[0]], 0, 0)
+        pondering = ponderHitEvent is not None and not ponderHitEvent.is_set() # no clock until the ponder hit
+        deadline = time.time() + timeLimit if timeLimit is not None and not pondering else None
+        nodes = 0
+        rootScores = [0] * len(validMoves)
+        position = pool.newSearch(gs)
+        self.moveOrderer.newSearch()
+        self.ponderDeadline = None
+        notations = [move.getChessNotation() for move in validMoves]
+        for depth in range(1, maxDepth + 1):
+            if stopEvent is not None and stopEvent.is_set():
+                break
+            if pondering and ponderHitEvent.is_set(): # tasks from now on get the clock, the running ones saw the hit
+                pondering = False
+                deadline = time.time() + timeLimit if timeLimit is not None else None
+            # best moves first, the last best one before those whose upper bound ties with its score
+            order = sorted(range(len(validMoves)), key=lambda i: (validMoves[i] == result.bestMove, rootScores[i]), reverse=True)
+            # the most likely best move is searched alone first, its score then bounds the search of all the others. That
+            # is done here, where the transposition table has the principal variation of every depth before
+            alpha, pv, taskNodes = self.searchRootMove(gs, validMoves[order[0]], depth, -CHECKMATE, CHECKMATE, deadline,
+                                                       remainingNodes(nodeLimit, nodes), stopEvent, ponderHitEvent if pondering else None, timeLimit)
+            nodes += taskNodes
+            if alpha is None:
+                break
+            results = {order[0]: (alpha, pv)}
+            # as in a principal variation search, the others only get a null window to prove they are no better. The
+            # few that fail high are searched again with the full window. They share what is left of the node budget
+            shareNodes = remainingNodes(nodeLimit, nodes, len(order) - 1)
+            tasks = [(position, i, notations[i], depth, alpha, alpha + PVS_WINDOW, deadline, shareNodes, pondering, timeLimit) for i in order[1:]]
+            failedHigh = []
+            for index, score, pv, taskNodes in pool.searchAll(tasks):
+                nodes += taskNodes
+                if score is not None:
+                    results[index] = (score, pv)
+                    if score > alpha:
+                        failedHigh.append(index)
+            if failedHigh and len(results) == len(validMoves):
+                shareNodes = remainingNodes(nodeLimit, nodes, len(failedHigh))
+                tasks = [(position, i, notations[i], depth, alpha, CHECKMATE, deadline, shareNodes, pondering, timeLimit) for i in failedHigh]
+                for index, score, pv, taskNodes in pool.searchAll(tasks):
+                    nodes += taskNodes
+                    if score is None:
+                        del results[index]
+                    else:
+                        results[index] = (score, pv)
+            if len(results) != len(validMoves): # some worker ran out of budget, this depth isn't finished
+                break
+            bestIndex = order[0]
+            for i in order: # moves that scored no better than alpha only have an upper bound, they can't be best
+                if results[i][0] > results[bestIndex][0]:
+                    bestIndex = i
+            for i in results:
+                rootScores[i] = results[i][0]
+            bestScore, pv = results[bestIndex]
+            result = self.report(returnQueue, SearchResult(validMoves[bestIndex], bestScore, pv, depth, nodes))
+            if abs(bestScore) >= ChessTablebase.TABLEBASE_WIN or (nodeLimit is not None and nodes >= nodeLimit):
+                break
+        if result.depth == 0:
+            result.nodes = nodes
+            self.report(returnQueue, result)
+        return result
+
+    def searchRootMove(self, gs, move, depth, alpha, beta, deadline, nodeLimit, stopEvent=None, ponderHitEvent=None, ponderTime=None):
+        '''Search one root move with the window (alpha, beta), for searchParallel. Returns (score for the side to
+        move at the root or None if the budget ran out, principal variation, nodes). Without a deadline a ponderHitEvent
+        starts the clock of ponderTime seconds when it is set'''
+        self.deadline, self.nodeLimit = deadline, nodeLimit
+        self.stopEvent = stopEvent
+        self.ponderHitEvent = self.ponderTime = None
+        if deadline is None and ponderHitEvent is not None:
+            if ponderHitEvent.is_set(): # keep the clock an earlier task started on the hit, don't start a new one
+                if self.ponderDeadline is None and ponderTime is not None:
+                    self.ponderDeadline = time.time() + ponderTime
+                self.deadline = self.ponderDeadline
+            else:
+                self.ponderHitEvent, self.ponderTime = ponderHitEvent, ponderTime
+        self.nodeCount = 0
+        if (self.deadline is not None and time.time() >= self.deadline) or (stopEvent is not None and stopEvent.is_set()):
+            return None, [], 0
+        movesMade = len(gs.moveLog)
+        turnMultiplier = 1 if gs.whiteToMove else -1
+        gs.makeMove(move)
+        try:
+            score = -self.findMoveNegaMaxAlphaBeta(gs, None, depth - 1, -beta, -alpha, -turnMultiplier, 1)
+            pv = [move] + self.getPrincipalVariation(gs, depth - 1)
+        except SearchTimeout:
+            score, pv = None, []
+        if ponderHitEvent is not None and self.ponderHitEvent is None and self.deadline is not None: # the hit came during this task
+            self.ponderDeadline = self.deadline
+        while len(gs.moveLog) > movesMade:
+            gs.undoMove()
+        return score, pv, self.nodeCount
+
+    def findBookMove(self, gs, validMoves):
+        '''A move from the opening book, None without a book or when the position isn't in it'''
+        if self.openingBook is None:
+            return None
+        return self.openingBook.getMove(gs, validMoves)
+
+    def findTablebaseMove(self, gs, validMoves):
+        '''(move, score) from the endgame tablebase, None without tables or when the position has too many pieces'''
+        if self.tablebase is None or len(validMoves) == 0:
+            return None
+        return self.tablebase.getRootMove(gs, validMoves)
+
+    def findCachedResult(self, gs, validMoves):
+        '''(depth, score, bound, move) of an earlier search of the position from the analysis cache, None without a cache
+        or when the position isn't in it'''
+        if self.analysisCache is None:
+            return None
+        entry = self.analysisCache.probe(gs)
+        if entry is None:
+            return None
+        depth, score, bound, notation = entry
+        for move in validMoves:
+            if move.getChessNotation() == notation:
+                return depth, score, bound, move
+        return None
+
+    def isCachedResultFinal(self, cached, maxDepth, timeLimit):
+        '''Whether a (depth, score, bound, move) from the analysis cache can be returned instead of searching. A mate or
+        tablebase score can: no deeper search changes it. Any other exact score has to be deep enough: maxDepth deep, or
+        with a time limit as deep as expectedDepth says a search in that time would get, if that is less'''
+        depth, score, bound, move = cached
+        if bound != EXACT:
+            return False
+        if abs(score) >= ChessTablebase.TABLEBASE_WIN:
+            return True
+        return depth >= min(maxDepth, expectedDepth(timeLimit))
+
+    def storeCachedResult(self, gs, depth, score, bestMove):
+        '''Keep the result of a finished root search in the analysis cache, the root is searched with a full window'''
+        if self.analysisCache is not None:
+            self.analysisCache.store(gs, depth, score, EXACT, bestMove.getChessNotation())
+
+    def moveBuffer(self, ply):
+        '''The reusable move list of a ply, the moves in it are only valid until the next node at that ply fills it'''
+        while len(self.moveBuffers) <= ply:
+            self.moveBuffers.append([])
+        return self.moveBuffers[ply]
+
+    def checkSearchLimits(self):
+        '''Stop the search by raising SearchTimeout once the budget is spent or the search was told to stop'''
+        if self.ponderHitEvent is not None and self.ponderHitEvent.is_set(): # pondering turned into the real search
+            self.ponderHitEvent = None
+            if self.ponderTime is not None:
+                self.deadline = time.time() + self.ponderTime
+        if (self.nodeLimit is not None and self.nodeCount >= self.nodeLimit) or (self.deadline is not None and time.time() >= self.deadline):
+            raise SearchTimeout()
+        if self.stopEvent is not None and self.stopEvent.is_set():
+            raise SearchTimeout()
+
+    def getPrincipalVariation(self, gs, depth):
+        '''Follow the best moves stored in the transposition table from the current position'''
+        pv = []
+        for _ in range(depth):
+            entry = self.transpositionTable.probe(gs.zobristKey)
+            if entry is None or entry[4] is None or entry[4] not in gs.getValidMoves():
+                break
+            pv.append(entry[4])
+            gs.makeMove(entry[4])
+        for _ in pv:
+            gs.undoMove()
+        return pv
+
+    def findMoveNegaMaxAlphaBeta(self, gs, validMoves, depth, alpha, beta, turnMultiplier, ply=0):
+        '''Principal variation search of gs: the first move gets the full (alpha, beta) window, every later one is only
+        tested with a null window to prove it is no better, and searched again with the full window if it is. Passing the
+        turn (null move) prunes nodes that are won anyway, and late quiet moves are searched a ply shallower.
+        The root gets its validMoves, every node below it is passed None and generates its moves stage by stage, so a
+        transposition cutoff or an early beta cutoff saves generating the rest'''
+        self.nodeCount += 1
+        if self.nodeCount % LIMIT_CHECK_INTERVAL == 0 or self.nodeCount == self.nodeLimit:
+            self.checkSearchLimits()
+        stats = self.stats
+        if stats is not None:
+            stats.nodes += 1
+        transpositionTable = self.transpositionTable
+        moveOrderer = self.moveOrderer
+        originalAlpha = alpha
+        hashMove = None
+        entry = transpositionTable.probe(gs.zobristKey)
+        if entry is not None:
+            hashMove = entry[4]
+            if stats is not None:
+                stats.transpositionHits += 1
+            if entry[1] >= depth and ply != 0: # the root still has to pick rootMove
+                score, bound = scoreFromTable(entry[2], ply), entry[3]
+                if bound == EXACT or (bound == LOWERBOUND and score >= beta) or (bound == UPPERBOUND and score <= alpha):
+                    if stats is not None:
+                        stats.transpositionCutoffs += 1
+                    return score
+        if validMoves is not None and len(validMoves) == 0: # no moves left is checkmate or stalemate
+            return scoreNoMoves(gs, ply)
+        if self.tablebase is not None and ply != 0: # an exact result, the subtree needn't be searched
+            score = self.tablebase.probeScore(gs)
+            if score is not None:
+                if score < 0 and len(gs.getValidMoves(self.moveBuffer(ply))) == 0: # mated already, which beats a tablebase loss
+                    score = scoreNoMoves(gs, ply)
+                transpositionTable.store(gs.zobristKey, MAX_DEPTH, scoreToTable(score, ply), EXACT, None)
+                return score
+        if depth == 0:
+            if validMoves is None and gs.inCheck(): # a mate on the horizon is still seen, quiescence can't tell
+                if len(gs.getValidMoves(self.moveBuffer(ply))) == 0:
+                    return scoreNoMoves(gs, ply)
+            return self.quiescenceSearch(gs, alpha, beta, turnMultiplier, ply)
+        inCheck = gs.inCheck()
+        # null move: if the side to move is still above beta after passing, a real move would be too. Passing is only
+        # safe with pieces on the board, with king and pawns alone every move can be worse than none (zugzwang)
+        if ply != 0 and depth >= NULL_MOVE_MIN_DEPTH and not inCheck and gs.moveLog[-1] is not None and \
+            abs(beta) < ChessTablebase.TABLEBASE_WIN and turnMultiplier * scorePosition(gs) >= beta and hasPieces(gs):
+            gs.makeNullMove()
+            score = -self.findMoveNegaMaxAlphaBeta(gs, None, depth - 1 - NULL_MOVE_REDUCTION, -beta, -beta + PVS_WINDOW, -turnMultiplier, ply + 1)
+            gs.undoMove()
+            if score >= beta:
+                if stats is not None:
+                    stats.nullMoveCutoffs += 1
+                return beta
+        if validMoves is None:
+            moves = moveOrderer.stagedMoves(gs, hashMove, ply)
+        else:
+            moveOrderer.orderMoves(validMoves, hashMove, ply)
+            moves = validMoves
+        maxScore = -CHECKMATE
+        bestMove = None
+        movesSearched = 0
+        for move in moves:
+            gs.makeMove(move)
+            if movesSearched == 0:
+                score = -self.findMoveNegaMaxAlphaBeta(gs, None, depth - 1, -beta, -alpha ,-turnMultiplier, ply + 1)
+            else:
+                reduction = 0
+                if depth >= LMR_MIN_DEPTH and movesSearched >= LMR_FULL_DEPTH_MOVES and not inCheck and not move.isCapture and not move.pawnPromotion and not gs.inCheck():
+                    reduction = 1
+                score = -self.findMoveNegaMaxAlphaBeta(gs, None, depth - 1 - reduction, -alpha - PVS_WINDOW, -alpha, -turnMultiplier, ply + 1)
+                if score > alpha and reduction: # the reduced search may have missed something, look at full depth
+                    if stats is not None:
+                        stats.researches += 1
+                    score = -self.findMoveNegaMaxAlphaBeta(gs, None, depth - 1, -alpha - PVS_WINDOW, -alpha, -turnMultiplier, ply + 1)
+                if alpha < score < beta: # better than the moves before, its exact score needs the full window
+                    if stats is not None:
+                        stats.researches += 1
+                    score = -self.findMoveNegaMaxAlphaBeta(gs, None, depth - 1, -beta, -alpha, -turnMultiplier, ply + 1)
+            movesSearched += 1
+            if score > maxScore:
+                maxScore = score
+                bestMove = move
+                if ply == 0:
+                    self.rootMove = move
+            gs.undoMove()
+            if maxScore > alpha: # pruining happens
+                alpha = maxScore
+            if alpha >= beta:
+                moveOrderer.recordCutoff(move, depth, ply)
+                if stats is not None:
+                    stats.cutoffs += 1
+                    if movesSearched == 1:
+                        stats.firstMoveCutoffs += 1
+                break
+        if movesSearched == 0: # the staged moves ran out at once, getStagedMoves has set checkMate or staleMate
+            return scoreNoMoves(gs, ply)
+
+        if maxScore <= originalAlpha:
+            bound = UPPERBOUND
+        elif maxScore >= beta:
+            bound = LOWERBOUND
+        else:
+            bound = EXACT
+        transpositionTable.store(gs.zobristKey, depth, scoreToTable(maxScore, ply), bound, bestMove)
+        return maxScore
+
+    def quiescenceSearch(self, gs, alpha, beta, turnMultiplier, ply):
+        '''Keep searching captures and promotions only, until the position is quiet enough to be scored.
+        The side to move may always "stand pat" and take the static score instead of capturing.'''
+        self.nodeCount += 1
+        if self.nodeCount % LIMIT_CHECK_INTERVAL == 0 or self.nodeCount == self.nodeLimit:
+            self.checkSearchLimits()
+        if self.stats is None:
+            maxScore = turnMultiplier * scorePosition(gs)
+        else:
+            self.stats.quiescenceNodes += 1
+            start = time.perf_counter()
+            maxScore = turnMultiplier * scorePosition(gs)
+            self.stats.evaluationTime += time.perf_counter() - start
+        if maxScore >= beta:
+            return maxScore
+        if maxScore > alpha:
+            alpha = maxScore
+        standPat = maxScore
+
+        captures = gs.getCaptureMoves(self.moveBuffer(ply)) # the moves of the node that called us aren't needed any more
+        self.moveOrderer.orderMoves(captures, None, ply)
+        for move in captures:
+            # delta pruning: skip captures that can't win back enough material even with a margin
+            gain = pieceScore[move.pieceCaptured[1]] if move.isCapture else 0
+            if move.pawnPromotion:
+                gain += pieceScore[move.promotionPiece] - pieceScore['p']
+            if standPat + gain + DELTA_MARGIN <= alpha:
+                continue
+            gs.makeMove(move)
+            score = -self.quiescenceSearch(gs, -beta, -alpha, -turnMultiplier, ply + 1)
+            gs.undoMove()
+            if score > maxScore:
+                maxScore = score
+            if maxScore > alpha:
+                alpha = maxScore
+            if alpha >= beta:
+                break
+        return maxScore
+
+class RootPool:
+    '''Worker processes for Searcher.searchParallel that last for many searches. Every worker keeps its searcher, and
+    with it its transposition table and move ordering, from one search to the next. A task only carries the start FEN
+    and the moves of the position, which a worker catches up with on its own game state, and the root move to search.
+    The stop and ponder hit events are given once, as processes can only share them from their start'''
+    def __init__(self, workers=WORKERS, useTablebase=True, stopEvent=None, ponderHitEvent=None):
+        self.workers = workers
+        self.gameId = 0
+        self.searchId = 0
+        self.pool = Pool(workers, initializer=initRootWorker, initargs=(useTablebase, stopEvent, ponderHitEvent))
+
+    def newSearch(self, gs):
+        '''The position part of the tasks of a new search of gs'''
+        self.searchId += 1
+        return self.gameId, self.searchId, type(gs), gs.startFEN, tuple(move.getChessNotation() for move in gs.moveLog)
+
+    def searchAll(self, tasks):
+        '''The (index, score or None, principal variation, nodes) of root move tasks (see searchRootMove), searched
+        side by side, in the order they finish'''
+        return self.pool.imap_unordered(searchRootMove, tasks)
+
+    def newGame(self):
+        '''Have the workers forget what they learned, each of them when it gets its next task'''
+        self.gameId += 1
+
+    def close(self):
+        '''End the worker processes, they are idle between searches'''
+        self.pool.terminate()
+        self.pool.join()
+
+
+def findBestMove(gs, validMoves, returnQueue, timeLimit=TIME_LIMIT, nodeLimit=None, maxDepth=MAX_DEPTH, stopEvent=None, stats=None, ponderHitEvent=None):
+    '''Searcher.search with a new searcher using the default opening book and tablebase, for a process that searches
+    once, like the ones ChessMain starts. Puts the results on returnQueue and returns the best move'''
+    result = Searcher(openingBook, tablebase).search(gs, validMoves, returnQueue, timeLimit, nodeLimit, maxDepth, stopEvent, stats, ponderHitEvent)
+    return result.bestMove if result is not None else None
+
+def findBestMoveParallel(gs, validMoves, returnQueue, workers=WORKERS, timeLimit=TIME_LIMIT, nodeLimit=None, maxDepth=MAX_DEPTH):
+    '''Searcher.searchParallel the same way as findBestMove'''
+    result = Searcher(openingBook, tablebase).searchParallel(gs, validMoves, returnQueue, workers, timeLimit, nodeLimit, maxDepth)
+    return result.bestMove if result is not None else None
+
+def initRootWorker(useTablebase, stopEvent, ponderHitEvent):
+    '''Pool initializer, every worker gets a searcher of its own and the events of the searches'''
+    global workerSearcher, workerEvents, workerPosition
+    workerSearcher = Searcher(tablebase=tablebase if useTablebase else None)
+    workerEvents = (stopEvent, ponderHitEvent)
+    workerPosition = (None, None, None, []) # game id, search id, game state and the moves made on it since its start FEN
+
+def expectedDepth(timeLimit):
+    '''The depth a search with a time limit of that many seconds usually finishes, from TIME_LIMIT_DEPTHS. Without a
+    time limit the search can go as deep as MAX_DEPTH'''
+    if timeLimit is None:
+        return MAX_DEPTH
+    depth = 1
+    for seconds, limitDepth in TIME_LIMIT_DEPTHS:
+        if timeLimit >= seconds:
+            depth = limitDepth
+    seconds = TIME_LIMIT_DEPTHS[-1][0]
+    while timeLimit >= seconds * DEPTH_TIME_FACTOR and depth < MAX_DEPTH: # past the table
+        seconds *= DEPTH_TIME_FACTOR
+        depth += 1
+    return depth
+
+def remainingNodes(nodeLimit, nodes, shares=1):
+    '''Node budget of each of shares tasks that split what is left of nodeLimit after nodes'''
+    return None if nodeLimit is None else max((nodeLimit - nodes) // shares, 1)
+
+def searchRootMove(task):
+    '''Search one root move in a pool worker. Returns (index, score or None, principal variation, nodes)'''
+    global workerPosition
+    (gameId, searchId, gameStateClass, startFEN, moves), index, notation, depth, alpha, beta, deadline, nodeLimit, pondering, ponderTime = task
+    workerGameId, workerSearchId, gs, playedMoves = workerPosition
+    if searchId != workerSearchId:
+        if gameId != workerGameId:
+            workerSearcher.newGame()
+        workerSearcher.moveOrderer.newSearch()
+        workerSearcher.ponderDeadline = None # the clock of the last search's ponder hit
+        gs, playedMoves = followMoves(gs, playedMoves, startFEN, moves, gameStateClass)
+        workerPosition = (gameId, searchId, gs, playedMoves)
+    stopEvent, ponderHitEvent = workerEvents
+    score, pv, nodes = workerSearcher.searchRootMove(gs, findMove(gs, notation), depth, alpha, beta, deadline, nodeLimit, stopEvent,
+                                                     ponderHitEvent if pondering else None, ponderTime)
+    return index, score, pv, nodes
 
+def followMoves(gs, playedMoves, startFEN, moves, gameStateClass):
+    '''Bring gs from playedMoves to moves: take back the moves after the part both have in common and make the new
+    ones. Returns (gs, playedMoves) for the position, a new gameStateClass if gs is None or starts elsewhere, and
+    (None, []) if one of the moves isn't valid'''
+    if gs is None or type(gs) is not gameStateClass or gs.startFEN != startFEN:
+        gs = gameStateClass(startFEN)
+        playedMoves = []
+    common = 0
+    while common < len(playedMoves) and common < len(moves) and playedMoves[common] == moves[common]:
+        common += 1
+    while len(playedMoves) > common:
+        gs.undoMove()
+        playedMoves.pop()
+    for notation in moves[common:]:
+        move = findMove(gs, notation)
+        if move is None:
+            return None, []
+        gs.makeMove(move)
+        playedMoves.append(notation)
+    return gs, playedMoves
+
+def findMove(gs, notation):
+    '''The valid move with the long algebraic notation (e2e4, e7e8q) or None'''
+    for move in gs.getValidMoves():
+        if move.getChessNotation() == notation:
+            return move
+    return None
 
 def findRandomMove(validMoves):
     '''Picks and returns a random move'''
@@ -102,113 +848,117 @@ def findBestMove(gs, validMoves):
     return bestPlayerMove
  """
 
-def findBestMove(gs, validMoves, returnQueue):
-    '''Helper method to make first recursive call'''
-    global nextMove
-    nextMove = None
-    random.shuffle(validMoves)
-    # findMoveMinMax(gs, validMoves, DEPTH, gs.whiteToMove)
-    findMoveNegaMaxAlphaBeta(gs, validMoves, DEPTH, -CHECKMATE, CHECKMATE, 1 if gs.whiteToMove else -1)
-    returnQueue.put(nextMove)
-
 def findMoveMinMax(gs, validMoves, depth, whiteToMove):
-    global nextMove
+    '''(score, best move) of a plain minimax search to depth'''
     if depth == 0:
-        return scoreMaterial(gs.board)
+        return scoreMaterial(gs.board), None
 
+    bestMove = None
     if whiteToMove:
         maxScore = -CHECKMATE
         for move in validMoves:
             gs.makeMove(move)
             nextMoves = gs.getValidMoves()
-            score = findMoveMinMax(gs, nextMoves, depth - 1, False)
+            score = findMoveMinMax(gs, nextMoves, depth - 1, False)[0]
             if score > maxScore:
                 maxScore = score
-                if depth == DEPTH:
-                    nextMove = move
-                    print(move, score)
+                bestMove = move
             gs.undoMove()
-        return maxScore
+        return maxScore, bestMove
     else:
         minScore = CHECKMATE
         for move in validMoves:
             gs.makeMove(move)
             nextMoves = gs.getValidMoves()
-            score = findMoveMinMax(gs, nextMoves, depth - 1, True)
+            score = findMoveMinMax(gs, nextMoves, depth - 1, True)[0]
             if score < minScore:
                 minScore = score
-                if depth == DEPTH:
-                    nextMove = move
+                bestMove = move
             gs.undoMove()
-        return minScore
+        return minScore, bestMove
 
 def findMoveNegaMax(gs, validMoves, depth, turnMultiplier):
-    global nextMove
+    '''(score, best move) of a plain negamax search to depth'''
     if depth == 0:
-        return turnMultiplier * scoreBoard(gs)
+        return turnMultiplier * scoreBoard(gs), None
     
     maxScore = -CHECKMATE
+    bestMove = None
     for move in validMoves:
         gs.makeMove(move)
         nextMoves = gs.getValidMoves()
-        score = -findMoveNegaMax(gs, nextMoves, depth - 1, -turnMultiplier)
+        score = -findMoveNegaMax(gs, nextMoves, depth - 1, -turnMultiplier)[0]
         if score > maxScore:
             maxScore = score
-            if depth == DEPTH:
-                nextMove = move
+            bestMove = move
         gs.undoMove()
-    return maxScore
+    return maxScore, bestMove
+
+def hasPieces(gs):
+    '''True if the side to move has a piece other than its king and pawns'''
+    allyColor = 'w' if gs.whiteToMove else 'b'
+    for row in gs.board:
+        for square in row:
+            if square[0] == allyColor and square[1] in "NBRQ":
+                return True
+    return False
+
+
+def scoreNoMoves(gs, ply):
+    '''Score for the side to move of a node without moves at ply: mated, the sooner the worse, or stalemate'''
+    return -CHECKMATE + ply if gs.checkMate else STALEMATE
+
+def scoreToTable(score, ply):
+    '''Mate scores count plies from the root, the transposition table keeps them counted from the node so an
+    entry is right wherever the position turns up again'''
+    if score >= MATE_THRESHOLD:
+        return score + ply
+    if score <= -MATE_THRESHOLD:
+        return score - ply
+    return score
+
+def scoreFromTable(score, ply):
+    if score >= MATE_THRESHOLD:
+        return score - ply
+    if score <= -MATE_THRESHOLD:
+        return score + ply
+    return score
+
+def matePlies(score):
+    '''Plies to the mate of a mate score, positive when the side to move mates, negative when it is mated, None for
+    any other score'''
+    if score >= MATE_THRESHOLD:
+        return round(CHECKMATE - score)
+    if score <= -MATE_THRESHOLD:
+        return -round(CHECKMATE + score)
+    return None
+
+def reportedScore(score):
+    '''(centipawns, mate) of a score for the side to move, as UCI reports it. A mate has no centipawns but the moves
+    to it, negative when the side to move gets mated. Otherwise mate is None, and a tablebase win, which has no mate
+    distance, gets TABLEBASE_WIN_CP'''
+    plies = matePlies(score)
+    if plies is not None:
+        return None, (plies + 1) // 2 if plies > 0 else plies // 2
+    if abs(score) >= ChessTablebase.TABLEBASE_WIN:
+        return (TABLEBASE_WIN_CP if score > 0 else -TABLEBASE_WIN_CP), None
+    return round(score * 100), None
 
-def findMoveNegaMaxAlphaBeta(gs, validMoves, depth, alpha, beta, turnMultiplier):
-    global nextMove
-    if depth == 0:
-        return turnMultiplier * scoreBoard(gs)
-    # TODO: move ordering 
-    maxScore = -CHECKMATE
-    for move in validMoves:
-        gs.makeMove(move)
-        nextMoves = gs.getValidMoves()
-        score = -findMoveNegaMaxAlphaBeta(gs, nextMoves, depth - 1, -beta, -alpha ,-turnMultiplier)
-        if score > maxScore:
-            maxScore = score
-            if depth == DEPTH:
-                nextMove = move
-        gs.undoMove()
-        if maxScore > alpha: # pruining happens
-            alpha = maxScore
-        if alpha >= beta:
-            break
-    return maxScore
-    
 def scoreBoard(gs):
     '''A positive score is good for white, a negative score is good for black'''
-    if gs.checkmate:
+    if gs.checkMate:
         if gs.whiteToMove:
             return -CHECKMATE # b wins
         else:
             return CHECKMATE # w wins
-    elif gs.stalemate:
+    elif gs.staleMate:
         return STALEMATE
+    return scorePosition(gs)
 
-    score = 0
-    for row in range(len(gs.board)):
-        for column in range(len(gs.board[row])):
-            square = gs.board[row][column]
-            if square != "--":
-                # score it positionally
-                piecePositionScore = 0
-                if square[1] != 'K': # no position table for king
-                    if square[1] == "p": # for pawns
-                        piecePositionScore = piecePositionScores[square][row][column]
-                    else: # for other pieces
-                        piecePositionScore = piecePositionScores[square[1]][row][column]
-
-                if square[0] == 'w':
-                    score += pieceScore[square[1]] + piecePositionScore * .1
-                elif square[0] == 'b':
-                    score -= pieceScore[square[1]] + piecePositionScore * .1
-    
-    return score
+def scorePosition(gs):
+    '''Material and piece position score, without looking for checkmate or stalemate.
+    GameState keeps both totals up to date in makeMove/undoMove, so this doesn't have to look at the board'''
+    return gs.materialScore + gs.positionScore * .1
 
 
 def scoreMaterial(board):
@@ -0,0 +1,192 @@
+'''
+Batch analysis: search every position of an EPD or PGN file with a fixed depth or time per position and write one
+JSON line per position (best move, score, mate, depth, nodes, time). The score is in centipawns for the side to
+move. A forced mate has a null score and the moves to it as mate, negative when the side to move gets mated.
+The file is read as a stream and only a few positions per worker are ever in flight, so memory stays flat however
+big the input is.
+With --cache the results are also kept in an SQLite file, and positions found there deep enough aren't searched again:
+as deep as --depth, or as deep as a search in --time usually gets (ChessAI.expectedDepth), or a forced mate.
+Usage: python Chess/ChessAnalysis.py games.pgn [-o results.jsonl] [--depth N | --time SECONDS] [--workers N] [--every N]
+       [--cache FILE]
+'''
+
+import argparse
+import collections
+import json
+import os
+import random
+import re
+import sys
+import time
+from multiprocessing import Pool
+import ChessEngine, ChessAI, ChessBitboard, ChessCache
+
+DEFAULT_DEPTH = 3
+PENDING_PER_WORKER = 4 # positions handed out ahead per worker, enough to keep them all busy
+
+SAN_PATTERN = re.compile(r"^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?$")
+PGN_TAG_PATTERN = re.compile(r'^\[(\w+)\s+"(.*)"\]\s*$')
+# comments, variations, NAGs, move numbers and results in PGN movetext, everything that isn't a move
+PGN_NOISE_PATTERN = re.compile(r"\{[^}]*\}|;[^\n]*|\$\d+|\d+\.(?:\.\.)?|1-0|0-1|1/2-1/2|\*")
+
+
+def parseSAN(gs, san, validMoves=None):
+    '''The valid move written as san (Nf3, exd5, e8=Q, O-O, ...) in the current position, or None'''
+    if validMoves is None:
+        validMoves = gs.getValidMoves()
+    san = san.rstrip("+#!?")
+    if san in ("O-O", "0-0", "O-O-O", "0-0-0"):
+        endColumn = 6 if len(san) == 3 else 2
+        for move in validMoves:
+            if move.castle and move.endColumn == endColumn:
+                return move
+        return None
+    match = SAN_PATTERN.match(san)
+    if match is None:
+        return None
+    piece, fromFile, fromRank, endSquare, promotion = match.groups()
+    piece = piece or 'p'
+    endRow, endColumn = ChessEngine.Move.ranks2Rows[endSquare[1]], ChessEngine.Move.files2Cols[endSquare[0]]
+    for move in validMoves:
+        if move.pieceMoved[1] != piece or move.endRow != endRow or move.endColumn != endColumn or move.castle:
+            continue
+        if fromFile is not None and move.startColumn != ChessEngine.Move.files2Cols[fromFile]:
+            continue
+        if fromRank is not None and move.startRow != ChessEngine.Move.ranks2Rows[fromRank]:
+            continue
+        if move.pawnPromotion and move.promotionPiece != (promotion or "Q"):
+            continue
+        return move
+    return None
+
+def readEPD(file):
+    '''(id, FEN) of every position of an EPD file, the id comes from the "id" operation or is the line number'''
+    for lineNumber, line in enumerate(file, 1):
+        fields = line.split(None, 4)
+        if len(fields) < 4:
+            continue
+        positionId = str(lineNumber)
+        if len(fields) == 5:
+            idMatch = re.search(r'\bid\s+"([^"]*)"', fields[4])
+            if idMatch:
+                positionId = idMatch.group(1)
+        yield positionId, " ".join(fields[:4])
+
+def readPGNGames(file):
+    '''(tags, movetext) of every game of a PGN file, one game at a time. The movetext keeps its line breaks, a ;
+    comment only runs to the end of its line'''
+    tags = {}
+    movetext = []
+    for line in file:
+        line = line.strip()
+        tagMatch = PGN_TAG_PATTERN.match(line)
+        if tagMatch:
+            if movetext: # tags after moves start the next game
+                yield tags, "\n".join(movetext)
+                tags, movetext = {}, []
+            tags[tagMatch.group(1)] = tagMatch.group(2)
+        elif line and not line.startswith("%"):
+            movetext.append(line)
+    if tags or movetext:
+        yield tags, "\n".join(movetext)
+
+def readPGN(file, every=1):
+    '''(id, FEN) of every position reached in the games of a PGN file, or of every 'every'th ply. The id is
+    "<game number>.<ply>". A game with a move that can't be read is cut off there'''
+    for gameNumber, (tags, movetext) in enumerate(readPGNGames(file), 1):
+        try:
+            gs = ChessBitboard.BitboardGameState(tags.get("FEN", ChessEngine.STARTING_FEN))
+        except ValueError:
+            continue
+        movetext = PGN_NOISE_PATTERN.sub(" ", movetext)
+        stripped = 1
+        while stripped: # variations can nest, strip the innermost ones first. An unclosed one is left to parseSAN
+            movetext, stripped = re.subn(r"\([^()]*\)", " ", movetext)
+        for ply, san in enumerate(movetext.split(), 1):
+            move = parseSAN(gs, san)
+            if move is None:
+                break
+            gs.makeMove(move)
+            if ply % every == 0:
+                yield "%d.%d" % (gameNumber, ply), gs.getFEN()
+
+def initWorker(cacheFile=None):
+    '''Pool initializer: every worker gets a searcher without the opening book, answers must come from the search.
+    Every worker opens the analysis cache itself, SQLite connections can't be shared between processes'''
+    global searcher
+    searcher = ChessAI.Searcher(tablebase=ChessAI.tablebase,
+                                analysisCache=ChessCache.AnalysisCache(cacheFile) if cacheFile is not None else None)
+
+def analysePosition(task):
+    '''Search one position in a pool worker, returns the JSON record of the result'''
+    positionId, fen, depth, timeLimit = task
+    record = {"id": positionId, "fen": fen}
+    try:
+        gs = ChessBitboard.BitboardGameState(fen)
+    except ValueError as e:
+        record["error"] = str(e)
+        return record
+    validMoves = gs.getValidMoves()
+    if len(validMoves) == 0:
+        centipawns, mate = ChessAI.reportedScore(ChessAI.scoreNoMoves(gs, 0))
+        record.update(bestmove=None, score=centipawns, mate=mate, depth=0, nodes=0, time=0)
+        return record
+    # every position is searched on its own, with fresh tables and a root shuffle seeded by the position, so with a
+    # fixed depth the results don't depend on the input order or on the worker that got the position
+    searcher.newGame()
+    random.seed(fen)
+    start = time.perf_counter()
+    result = searcher.search(gs, validMoves, None, timeLimit, None, depth)
+    elapsed = time.perf_counter() - start
+    centipawns, mate = ChessAI.reportedScore(result.score)
+    record.update(bestmove=result.bestMove.getChessNotation(), score=centipawns, mate=mate, depth=result.depth, nodes=result.nodes,
+                  time=round(elapsed, 3), pv=[move.getChessNotation() for move in result.pv])
+    return record
+
+def analyse(positions, output, workers, depth=DEFAULT_DEPTH, timeLimit=None, cacheFile=None):
+    '''Search every (id, FEN) of positions in a pool of workers and write the records to output in input order.
+    Returns the number of positions analysed'''
+    count = 0
+    with Pool(workers, initializer=initWorker, initargs=(cacheFile,)) as pool:
+        pending = collections.deque()
+        for positionId, fen in positions:
+            pending.append(pool.apply_async(analysePosition, ((positionId, fen, depth, timeLimit),)))
+            if len(pending) >= workers * PENDING_PER_WORKER: # don't read further ahead than the workers can take
+                output.write(json.dumps(pending.popleft().get()) + "\n")
+                output.flush()
+                count += 1
+        while pending:
+            output.write(json.dumps(pending.popleft().get()) + "\n")
+            output.flush()
+            count += 1
+    return count
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyse every position of an EPD or PGN file")
+    parser.add_argument("input", help="EPD or PGN file, by extension")
+    parser.add_argument("-o", "--output", help="JSONL file for the results, standard output by default")
+    parser.add_argument("--depth", type=int, help="search depth per position (default %d)" % DEFAULT_DEPTH)
+    parser.add_argument("--time", type=float, help="search time per position in seconds, instead of a depth")
+    parser.add_argument("--workers", type=int, default=ChessAI.WORKERS, help="worker processes (default one per CPU)")
+    parser.add_argument("--every", type=int, default=1, help="PGN only: analyse every Nth ply")
+    parser.add_argument("--cache", help="SQLite file that keeps results between runs")
+    args = parser.parse_args()
+    depth = args.depth if args.depth is not None else (ChessAI.MAX_DEPTH if args.time is not None else DEFAULT_DEPTH)
+
+    start = time.perf_counter()
+    with open(args.input) as file:
+        if os.path.splitext(args.input)[1].lower() == ".pgn":
+            positions = readPGN(file, max(args.every, 1))
+        else:
+            positions = readEPD(file)
+        if args.output is None:
+            count = analyse(positions, sys.stdout, args.workers, depth, args.time, args.cache)
+        else:
+            with open(args.output, "w") as output:
+                count = analyse(positions, output, args.workers, depth, args.time, args.cache)
+    elapsed = time.perf_counter() - start
+    print("%d positions in %.1fs, %.1f positions/s" % (count, elapsed, count / elapsed if elapsed else 0), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
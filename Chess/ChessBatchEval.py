@@ -0,0 +1,55 @@
+'''
+Batch evaluation: score many positions in one vectorised NumPy pass with the same material and piece position tables
+as ChessAI.scoreBoard, for offline analysis and training data. Gives exactly the scores scoreBoard gives.
+A position is encoded as 64 int8 piece codes (row * 8 + column): 0 empty, 1-6 white p N B R Q K, 7-12 black
+p N B R Q K. A batch is an (N, 64) array of codes or an (N, 12, 64) array of 0/1 planes, one plane per piece code 1-12.
+Needs NumPy, which nothing else in the engine does (pip install numpy).
+'''
+
+import numpy as np
+import ChessAI, ChessEval
+
+PIECE_CODES = ["--"] + [color + piece for color in "wb" for piece in "pNBRQK"]
+PIECE_CODE_INDEX = {piece: code for code, piece in enumerate(PIECE_CODES)}
+
+# per piece code: signed material, and signed position score of every square
+MATERIAL_TABLE = np.array([0] + [(1 if piece[0] == 'w' else -1) * ChessEval.pieceScore[piece[1]] for piece in PIECE_CODES[1:]], dtype=np.int64)
+POSITION_TABLE = np.array([[0] * 64] + [[(1 if piece[0] == 'w' else -1) * score for score in ChessEval.pieceSquareScores[piece]]
+                                        for piece in PIECE_CODES[1:]], dtype=np.int64)
+
+
+def encodePosition(gs):
+    '''The 64 piece codes of a GameState'''
+    return np.array([PIECE_CODE_INDEX[square] for row in gs.board for square in row], dtype=np.int8)
+
+def encodePositions(gameStates):
+    '''(codes, whiteToMove, checkMate, staleMate) arrays for a list of GameStates, ready for scorePositions'''
+    codes = np.array([encodePosition(gs) for gs in gameStates], dtype=np.int8).reshape(-1, 64)
+    whiteToMove = np.array([gs.whiteToMove for gs in gameStates], dtype=bool)
+    checkMate = np.array([gs.checkMate for gs in gameStates], dtype=bool)
+    staleMate = np.array([gs.staleMate for gs in gameStates], dtype=bool)
+    return codes, whiteToMove, checkMate, staleMate
+
+def planesToCodes(planes):
+    '''(N, 12, 64) piece planes to (N, 64) piece codes'''
+    planes = np.asarray(planes)
+    return (planes.argmax(axis=1) + 1) * planes.any(axis=1)
+
+def scorePositions(positions, whiteToMove=None, checkMate=None, staleMate=None):
+    '''scoreBoard of every position of the batch, as a float64 array. Positive is good for white.
+    Without the checkMate/staleMate flags it is scorePosition, the score without looking for mate'''
+    codes = np.asarray(positions)
+    if codes.ndim == 3:
+        codes = planesToCodes(codes)
+    codes = codes.astype(np.intp)
+    materialScores = MATERIAL_TABLE[codes].sum(axis=1)
+    positionScores = POSITION_TABLE[codes, np.arange(64)].sum(axis=1)
+    # the same float operations as ChessAI.scorePosition, so the results are equal to the last bit
+    scores = materialScores + positionScores * .1
+    if checkMate is not None:
+        if whiteToMove is None:
+            raise ValueError("checkMate needs whiteToMove to know who was mated")
+        scores = np.where(checkMate, np.where(whiteToMove, -ChessAI.CHECKMATE, ChessAI.CHECKMATE), scores)
+    if staleMate is not None:
+        scores = np.where(staleMate, ChessAI.STALEMATE, scores)
+    return scores
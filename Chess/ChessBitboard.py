@@ -0,0 +1,304 @@
+'''
+Bitboard version of the GameState. Every piece type is kept as a 64-bit integer mask (bit = row * 8 + column) so that
+move generation works on whole sets of squares at once, using precomputed attack tables for knights, kings and pawns
+and ray tables for the sliding pieces. The 8x8 board is still kept next to the masks, so the rest of the program
+(drawing, the move log, ChessAI) can use a BitboardGameState exactly like a GameState.
+'''
+
+import ChessEngine
+
+KNIGHT_OFFSETS = ((-2, -1), (-2, 1), (-1, 2), (1, 2), (2, -1), (2, 1), (-1, -2), (1, -2))
+KING_OFFSETS = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+ROOK_DIRECTIONS = ((-1, 0), (0, -1), (1, 0), (0, 1))
+BISHOP_DIRECTIONS = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+
+ALL_SQUARES = (1 << 64) - 1
+SQUARE_COORDINATES = [divmod(square, 8) for square in range(64)] # square -> (row, column)
+
+
+def leaperAttacks(offsets):
+    '''For every square, the mask of squares a piece jumping by the given offsets attacks'''
+    table = []
+    for square in range(64):
+        row, column = SQUARE_COORDINATES[square]
+        mask = 0
+        for dRow, dColumn in offsets:
+            endRow, endColumn = row + dRow, column + dColumn
+            if 0 <= endRow < 8 and 0 <= endColumn < 8:
+                mask |= 1 << (endRow * 8 + endColumn)
+        table.append(mask)
+    return table
+
+def rayTable(direction):
+    '''For every square, the mask of squares from it (excluded) to the edge of the board in the given direction'''
+    table = []
+    for square in range(64):
+        row, column = SQUARE_COORDINATES[square]
+        mask = 0
+        for i in range(1, 8):
+            endRow, endColumn = row + direction[0] * i, column + direction[1] * i
+            if not (0 <= endRow < 8 and 0 <= endColumn < 8):
+                break
+            mask |= 1 << (endRow * 8 + endColumn)
+        table.append(mask)
+    return table
+
+KNIGHT_ATTACKS = leaperAttacks(KNIGHT_OFFSETS)
+KING_ATTACKS = leaperAttacks(KING_OFFSETS)
+PAWN_ATTACKS = {'w': leaperAttacks(((-1, -1), (-1, 1))), 'b': leaperAttacks(((1, -1), (1, 1)))} # squares a pawn of that color attacks
+
+# (ray table, True if the ray runs towards higher square numbers) for each direction.
+# On a "positive" ray the nearest blocker is the lowest set bit, otherwise it is the highest one.
+ROOK_RAYS = [(rayTable(d), d[0] * 8 + d[1] > 0) for d in ROOK_DIRECTIONS]
+BISHOP_RAYS = [(rayTable(d), d[0] * 8 + d[1] > 0) for d in BISHOP_DIRECTIONS]
+
+def betweenTable():
+    '''BETWEEN[a][b] is the mask of squares strictly between a and b if they share a line, otherwise 0'''
+    table = [[0] * 64 for _ in range(64)]
+    for square in range(64):
+        row, column = SQUARE_COORDINATES[square]
+        for direction in ROOK_DIRECTIONS + BISHOP_DIRECTIONS:
+            mask = 0
+            for i in range(1, 8):
+                endRow, endColumn = row + direction[0] * i, column + direction[1] * i
+                if not (0 <= endRow < 8 and 0 <= endColumn < 8):
+                    break
+                table[square][endRow * 8 + endColumn] = mask
+                mask |= 1 << (endRow * 8 + endColumn)
+    return table
+
+BETWEEN = betweenTable()
+
+
+def slidingAttacks(square, occupied, rays):
+    '''Squares attacked from square along the given rays, stopping at (and including) the first occupied square'''
+    attacks = 0
+    for table, positive in rays:
+        ray = table[square]
+        blockers = ray & occupied
+        if blockers:
+            if positive:
+                blocker = (blockers & -blockers).bit_length() - 1
+            else:
+                blocker = blockers.bit_length() - 1
+            ray ^= table[blocker]
+        attacks |= ray
+    return attacks
+
+def squaresOf(mask):
+    '''Yields the square numbers of the set bits of mask'''
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class BitboardGameState(ChessEngine.GameState):
+    def loadFEN(self, fen):
+        super().loadFEN(fen)
+        self.setUpBitboards()
+
+    def setUpBitboards(self):
+        '''Build the piece and color masks from the 8x8 board'''
+        self.pieceBitboards = {color + piece: 0 for color in 'wb' for piece in 'pNBRQK'}
+        self.occupancy = {'w': 0, 'b': 0}
+        for row in range(8):
+            for column in range(8):
+                square = self.board[row][column]
+                if square != "--":
+                    self.pieceBitboards[square] |= 1 << (row * 8 + column)
+                    self.occupancy[square[0]] |= 1 << (row * 8 + column)
+
+    def makeMove(self, move):
+        super().makeMove(move)
+        self.updateBitboards(move)
+
+    def undoMove(self):
+        if len(self.moveLog) != 0:
+            move = self.moveLog[-1]
+            super().undoMove()
+            if move is not None: # a null move leaves the masks alone
+                self.updateBitboards(move)
+
+    def updateBitboards(self, move):
+        '''XOR a move into the masks. Applying the same move twice restores the masks, so this both makes and undoes it'''
+        color = move.pieceMoved[0]
+        startBit = 1 << (move.startRow * 8 + move.startColumn)
+        endBit = 1 << (move.endRow * 8 + move.endColumn)
+        self.pieceBitboards[move.pieceMoved] ^= startBit
+        self.pieceBitboards[color + move.promotionPiece if move.pawnPromotion else move.pieceMoved] ^= endBit
+        self.occupancy[color] ^= startBit | endBit
+        if move.isCapture:
+            capturedBit = 1 << (move.startRow * 8 + move.endColumn) if move.enPassant else endBit
+            self.pieceBitboards[move.pieceCaptured] ^= capturedBit
+            self.occupancy[move.pieceCaptured[0]] ^= capturedBit
+        if move.castle:
+            if move.endColumn - move.startColumn == 2: # kingside
+                rookBits = (1 << (move.endRow * 8 + move.endColumn + 1)) | (1 << (move.endRow * 8 + move.endColumn - 1))
+            else: # queenside
+                rookBits = (1 << (move.endRow * 8 + move.endColumn - 2)) | (1 << (move.endRow * 8 + move.endColumn + 1))
+            self.pieceBitboards[color + "R"] ^= rookBits
+            self.occupancy[color] ^= rookBits
+
+    def attackersTo(self, square, color, occupied):
+        '''Mask of the pieces of color attacking square, with occupied as the blockers for the sliding pieces'''
+        bitboards = self.pieceBitboards
+        attackers = (PAWN_ATTACKS['b' if color == 'w' else 'w'][square] & bitboards[color + 'p']) | \
+            (KNIGHT_ATTACKS[square] & bitboards[color + 'N']) | (KING_ATTACKS[square] & bitboards[color + 'K'])
+        rooksQueens = bitboards[color + 'R'] | bitboards[color + 'Q']
+        if rooksQueens:
+            attackers |= slidingAttacks(square, occupied, ROOK_RAYS) & rooksQueens
+        bishopsQueens = bitboards[color + 'B'] | bitboards[color + 'Q']
+        if bishopsQueens:
+            attackers |= slidingAttacks(square, occupied, BISHOP_RAYS) & bishopsQueens
+        return attackers
+
+    def inCheck(self):
+        '''Determine if the current player is in check'''
+        color = 'w' if self.whiteToMove else 'b'
+        kingSquare = self.pieceBitboards[color + 'K'].bit_length() - 1
+        return self.attackersTo(kingSquare, 'b' if self.whiteToMove else 'w', self.occupancy['w'] | self.occupancy['b']) != 0
+
+    def squareUnderAttack(self, row, column):
+        '''Determine if the enemy can attack the square row, column'''
+        return self.attackersTo(row * 8 + column, 'b' if self.whiteToMove else 'w', self.occupancy['w'] | self.occupancy['b']) != 0
+
+    def getValidMoves(self, moves=None):
+        '''All moves considering checks. A list passed in as moves is cleared and filled instead of making a new one'''
+        moves = self.generateMoves(moves=moves)
+        if len(moves) == 0:
+            if self.check:
+                self.checkMate = True
+            else:
+                self.staleMate = True
+        else:
+            self.checkMate = False
+            self.staleMate = False
+        return moves
+
+    def getCaptureMoves(self, moves=None):
+        '''Only the legal captures and promotions, for the quiescence search'''
+        return self.generateMoves(capturesOnly=True, moves=moves)
+
+    def getQuietMoves(self, moves=None):
+        '''Only the legal moves that neither capture nor promote, castling included, for the quiet stage of getStagedMoves'''
+        return self.generateMoves(quietsOnly=True, moves=moves)
+
+    def getPieceMoves(self, row, column, moves=None):
+        '''The legal moves of the piece of the side to move on row, column, castling included for the king'''
+        return self.generateMoves(moves=moves, fromSquares=1 << (row * 8 + column))
+
+    def pinnedPieces(self, kingSquare, allyColor, enemyColor, occupied):
+        '''Maps the square of every ally piece pinned to its king to the mask of squares it may still move to'''
+        pins = {}
+        bitboards = self.pieceBitboards
+        for rays, sliders in ((ROOK_RAYS, bitboards[enemyColor + 'R'] | bitboards[enemyColor + 'Q']),
+                              (BISHOP_RAYS, bitboards[enemyColor + 'B'] | bitboards[enemyColor + 'Q'])):
+            if not sliders:
+                continue
+            # enemy sliders that would see the king if only enemy pieces could block them
+            for pinner in squaresOf(slidingAttacks(kingSquare, self.occupancy[enemyColor], rays) & sliders):
+                between = BETWEEN[kingSquare][pinner] & occupied
+                if between and not between & (between - 1): # exactly one (ally) piece in the way
+                    pins[between.bit_length() - 1] = BETWEEN[kingSquare][pinner] | (1 << pinner)
+        return pins
+
+    def generateMoves(self, capturesOnly=False, moves=None, fromSquares=ALL_SQUARES, quietsOnly=False):
+        '''All legal moves, only captures and promotions, or only the other moves with quietsOnly. Check evasions and pins are applied as masks, so illegal moves are never created.
+        The moves go into the list moves, after clearing it, if one is given. Only pieces on fromSquares are moved'''
+        if moves is None:
+            moves = []
+        else:
+            moves.clear()
+        board = self.board
+        bitboards = self.pieceBitboards
+        if self.whiteToMove:
+            allyColor, enemyColor = 'w', 'b'
+            push, startRow, backRow = -8, 6, 0
+        else:
+            allyColor, enemyColor = 'b', 'w'
+            push, startRow, backRow = 8, 1, 7
+        ally = self.occupancy[allyColor]
+        enemy = self.occupancy[enemyColor]
+        occupied = ally | enemy
+        if capturesOnly:
+            targets = enemy
+        elif quietsOnly:
+            targets = ~occupied & ALL_SQUARES
+        else:
+            targets = ~ally & ALL_SQUARES
+
+        kingSquare = bitboards[allyColor + 'K'].bit_length() - 1
+        checkers = self.attackersTo(kingSquare, enemyColor, occupied)
+        self.check = checkers != 0
+        kingCoordinates = SQUARE_COORDINATES[kingSquare]
+
+        # king moves, the king is lifted off the board so it can't hide behind itself from a slider
+        occupiedWithoutKing = occupied ^ (1 << kingSquare)
+        moveKing = (fromSquares >> kingSquare) & 1
+        if moveKing:
+            for endSquare in squaresOf(KING_ATTACKS[kingSquare] & targets):
+                if not self.attackersTo(endSquare, enemyColor, occupiedWithoutKing):
+                    moves.append(ChessEngine.Move(kingCoordinates, SQUARE_COORDINATES[endSquare], board))
+        if checkers & (checkers - 1): # double check, king has to move
+            return moves
+
+        if checkers: # only captures of the checking piece or blocks are allowed
+            checkMask = BETWEEN[kingSquare][checkers.bit_length() - 1] | checkers
+        else:
+            checkMask = ALL_SQUARES
+        pins = self.pinnedPieces(kingSquare, allyColor, enemyColor, occupied)
+
+        # pawns
+        for startSquare in squaresOf(bitboards[allyColor + 'p'] & fromSquares):
+            allowed = checkMask & pins.get(startSquare, ALL_SQUARES)
+            start = SQUARE_COORDINATES[startSquare]
+            endSquare = startSquare + push
+            promotion = endSquare // 8 == backRow
+            if not (occupied >> endSquare) & 1 and not (quietsOnly if promotion else capturesOnly): # 1 square move
+                if (allowed >> endSquare) & 1:
+                    self.addPawnMoves(start, SQUARE_COORDINATES[endSquare], moves, promotion)
+                if not capturesOnly and start[0] == startRow and not (occupied >> (endSquare + push)) & 1 and (allowed >> (endSquare + push)) & 1: # 2 square moves
+                    moves.append(ChessEngine.Move(start, SQUARE_COORDINATES[endSquare + push], board))
+            if quietsOnly:
+                continue
+            for endSquare in squaresOf(PAWN_ATTACKS[allyColor][startSquare] & enemy & allowed):
+                self.addPawnMoves(start, SQUARE_COORDINATES[endSquare], moves, endSquare // 8 == backRow)
+            if self.enPassantPossible:
+                endSquare = self.enPassantPossible[0] * 8 + self.enPassantPossible[1]
+                capturedSquare = endSquare - push
+                if (PAWN_ATTACKS[allyColor][startSquare] >> endSquare) & 1 and ((checkMask >> endSquare) & 1 or (checkers >> capturedSquare) & 1):
+                    # both pawns leave their squares at once, so test the king against the sliders directly
+                    occupiedAfter = (occupied ^ (1 << startSquare) ^ (1 << capturedSquare)) | (1 << endSquare)
+                    if not (slidingAttacks(kingSquare, occupiedAfter, ROOK_RAYS) & (bitboards[enemyColor + 'R'] | bitboards[enemyColor + 'Q'])) and \
+                        not (slidingAttacks(kingSquare, occupiedAfter, BISHOP_RAYS) & (bitboards[enemyColor + 'B'] | bitboards[enemyColor + 'Q'])):
+                        moves.append(ChessEngine.Move(start, SQUARE_COORDINATES[endSquare], board, enPassant=True))
+
+        # knights, a pinned knight can never move
+        for startSquare in squaresOf(bitboards[allyColor + 'N'] & fromSquares):
+            if startSquare not in pins:
+                start = SQUARE_COORDINATES[startSquare]
+                for endSquare in squaresOf(KNIGHT_ATTACKS[startSquare] & targets & checkMask):
+                    moves.append(ChessEngine.Move(start, SQUARE_COORDINATES[endSquare], board))
+
+        # sliding pieces
+        for piece, rays in (('B', BISHOP_RAYS), ('R', ROOK_RAYS), ('Q', ROOK_RAYS + BISHOP_RAYS)):
+            for startSquare in squaresOf(bitboards[allyColor + piece] & fromSquares):
+                start = SQUARE_COORDINATES[startSquare]
+                endSquares = slidingAttacks(startSquare, occupied, rays) & targets & checkMask & pins.get(startSquare, ALL_SQUARES)
+                for endSquare in squaresOf(endSquares):
+                    moves.append(ChessEngine.Move(start, SQUARE_COORDINATES[endSquare], board))
+
+        # castling, never out of or through check
+        if not checkers and not capturesOnly and moveKing:
+            if self.whiteToMove:
+                kingside, queenside = self.castlingRights & ChessEngine.WHITE_KINGSIDE, self.castlingRights & ChessEngine.WHITE_QUEENSIDE
+            else:
+                kingside, queenside = self.castlingRights & ChessEngine.BLACK_KINGSIDE, self.castlingRights & ChessEngine.BLACK_QUEENSIDE
+            if kingside and not (occupied >> (kingSquare + 1)) & 3 and \
+                not self.attackersTo(kingSquare + 1, enemyColor, occupied) and not self.attackersTo(kingSquare + 2, enemyColor, occupied):
+                moves.append(ChessEngine.Move(kingCoordinates, SQUARE_COORDINATES[kingSquare + 2], board, castle=True))
+            if queenside and not (occupied >> (kingSquare - 3)) & 7 and \
+                not self.attackersTo(kingSquare - 1, enemyColor, occupied) and not self.attackersTo(kingSquare - 2, enemyColor, occupied):
+                moves.append(ChessEngine.Move(kingCoordinates, SQUARE_COORDINATES[kingSquare - 2], board, castle=True))
+        return moves
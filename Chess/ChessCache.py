@@ -0,0 +1,70 @@
+'''
+Analysis cache: search results kept on disk from one run to the next, so positions that are asked for again and again
+(openings, common middlegames) needn't be searched from scratch every time. The results live in an SQLite file keyed by
+the position part of the FEN, so a key never points at the wrong position. When the file holds more than maxEntries
+positions, the ones used longest ago are dropped.
+'''
+
+import sqlite3
+import time
+
+CACHE_SIZE = 100000 # positions kept in the file
+EVICTION_INTERVAL = 256 # stores between two checks of the size
+
+
+def positionKey(gs):
+    '''Board, side to move, castling rights and en passant square of the FEN, without the move counters'''
+    return " ".join(gs.getFEN().split()[:4])
+
+
+class AnalysisCache():
+    def __init__(self, path, maxEntries=CACHE_SIZE):
+        '''Open or create the cache file. The connection may be used from another thread than this one, one at a time'''
+        self.maxEntries = maxEntries
+        self.connection = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL") # analysis workers read and write the file at the same time
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute('''CREATE TABLE IF NOT EXISTS analysis (position TEXT PRIMARY KEY, depth INTEGER,
+                                   score REAL, bound INTEGER, move TEXT, used REAL)''')
+        self.connection.execute("CREATE INDEX IF NOT EXISTS analysisUsed ON analysis (used)")
+        self.connection.commit()
+        self.storesSinceEviction = 0
+
+    def close(self):
+        self.evict()
+        self.connection.close()
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM analysis").fetchone()[0]
+
+    def probe(self, gs):
+        '''(depth, score, bound, move in long algebraic notation) stored for the position, or None.
+        The score is for the side to move, the bound one of ChessAI.EXACT/LOWERBOUND/UPPERBOUND'''
+        position = positionKey(gs)
+        row = self.connection.execute("SELECT depth, score, bound, move FROM analysis WHERE position = ?", (position,)).fetchone()
+        if row is not None:
+            with self.connection:
+                self.connection.execute("UPDATE analysis SET used = ? WHERE position = ?", (time.time(), position))
+        return row
+
+    def store(self, gs, depth, score, bound, move):
+        '''Keep the result of a search of the position, unless a deeper one is stored already'''
+        with self.connection:
+            self.connection.execute('''INSERT INTO analysis VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (position) DO UPDATE SET
+                                       depth = excluded.depth, score = excluded.score, bound = excluded.bound,
+                                       move = excluded.move, used = excluded.used WHERE excluded.depth >= analysis.depth''',
+                                    (positionKey(gs), depth, score, bound, move, time.time()))
+        self.storesSinceEviction += 1
+        if self.storesSinceEviction >= EVICTION_INTERVAL:
+            self.evict()
+
+    def evict(self):
+        '''Drop the least recently used positions beyond maxEntries'''
+        self.storesSinceEviction = 0
+        with self.connection:
+            self.connection.execute('''DELETE FROM analysis WHERE position IN
+                                       (SELECT position FROM analysis ORDER BY used DESC LIMIT -1 OFFSET ?)''', (self.maxEntries,))
+
+    def clear(self):
+        with self.connection:
+            self.connection.execute("DELETE FROM analysis")
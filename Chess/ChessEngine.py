@@ -2,42 +2,190 @@
 This class is responsible for storing all the information about the current state of a chess game. It will also be responsible for determining the valid moves at the current state. In addition, it will keep a move log.
 '''
 
+import random
+import ChessEval
+
+# Zobrist keys: one random 64-bit number per (piece, square), one for black to move, one per combination of castling
+# rights and one per en passant file. A position's hash is the XOR of the keys of everything in it, so a move only
+# has to XOR in and out the few keys it changes. The seed is fixed so that every process gets the same keys.
+zobristRandom = random.Random(20230514)
+ZOBRIST_PIECES = {color + piece: [zobristRandom.getrandbits(64) for _ in range(64)] for color in "wb" for piece in "pNBRQK"}
+ZOBRIST_BLACK_TO_MOVE = zobristRandom.getrandbits(64)
+ZOBRIST_CASTLING = [zobristRandom.getrandbits(64) for _ in range(16)]
+ZOBRIST_EN_PASSANT = [zobristRandom.getrandbits(64) for _ in range(8)]
+
+PROMOTION_PIECES = ("Q", "R", "B", "N")
+PROMOTION_INDEX = {piece: i for i, piece in enumerate(PROMOTION_PIECES)}
+
+# castling rights are kept as 4 bits in one int, in the same order as the ZOBRIST_CASTLING index
+WHITE_KINGSIDE = 1
+BLACK_KINGSIDE = 2
+WHITE_QUEENSIDE = 4
+BLACK_QUEENSIDE = 8
+# rights that survive a move from or to each square (row * 8 + column): king and rook squares lose theirs
+CASTLING_RIGHTS_KEPT = [15] * 64
+CASTLING_RIGHTS_KEPT[0] = 15 & ~BLACK_QUEENSIDE
+CASTLING_RIGHTS_KEPT[4] = 15 & ~(BLACK_KINGSIDE | BLACK_QUEENSIDE)
+CASTLING_RIGHTS_KEPT[7] = 15 & ~BLACK_KINGSIDE
+CASTLING_RIGHTS_KEPT[56] = 15 & ~WHITE_QUEENSIDE
+CASTLING_RIGHTS_KEPT[60] = 15 & ~(WHITE_KINGSIDE | WHITE_QUEENSIDE)
+CASTLING_RIGHTS_KEPT[63] = 15 & ~WHITE_KINGSIDE
+
+STARTING_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+# legal move generation limits where pieces may go with masks of squares (bit row * 8 + column of an int)
+ALL_SQUARES = (1 << 64) - 1
+# RAY_MASKS[square][(dRow, dColumn)]: the squares from square (excluded) to the edge of the board in that direction
+RAY_MASKS = [{} for _ in range(64)]
+for square in range(64):
+    for direction in ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1)):
+        mask = 0
+        row, column = square // 8 + direction[0], square % 8 + direction[1]
+        while 0 <= row < 8 and 0 <= column < 8:
+            mask |= 1 << (row * 8 + column)
+            row, column = row + direction[0], column + direction[1]
+        RAY_MASKS[square][direction] = mask
+
 class GameState():
-    def __init__(self):
-        # 8x8 board, 2d list, 2 characters per square. Notation: "color-piece"
-        self.board = [
-            ["bR", "bN", "bB", "bQ", "bK", "bB", "bN", "bR"],
-            ["bp", "bp", "bp", "bp", "bp", "bp", "bp", "bp"],
-            ["--", "--", "--", "--", "--", "--", "--", "--"],
-            ["--", "--", "--", "--", "--", "--", "--", "--"],
-            ["--", "--", "--", "--", "--", "--", "--", "--"],
-            ["--", "--", "--", "--", "--", "--", "--", "--"],
-            ["wp", "wp", "wp", "wp", "wp", "wp", "wp", "wp"],
-            ["wR", "wN", "wB", "wQ", "wK", "wB", "wN", "wR"]
-            ]
-        
+    def __init__(self, fen = STARTING_FEN):
         self.moveFunctions = {'p': self.getPawnMoves, 'R': self.getRookMoves, 'N': self.getKnightMoves, 'B': self.getBishopMoves, 'Q': self.getQueenMoves, 'K': self.getKingMoves}
+        self.loadFEN(fen)
+
+    def loadFEN(self, fen):
+        '''Set up the position of a FEN string and start a new move log from it. The move counters may be left out, as in EPD'''
+        fields = fen.split()
+        if len(fields) < 4:
+            raise ValueError("FEN needs at least 4 fields: " + fen)
+        ranks = fields[0].split("/")
+        if len(ranks) != 8:
+            raise ValueError("FEN board needs 8 ranks: " + fen)
 
-        self.whiteToMove = True
+        # 8x8 board, 2d list, 2 characters per square. Notation: "color-piece"
+        self.board = []
+        for rank in ranks:
+            row = []
+            for character in rank:
+                if character.isdigit():
+                    row.extend(["--"] * int(character))
+                elif character.upper() in "PNBRQK":
+                    row.append(("w" if character.isupper() else "b") + ("p" if character.upper() == "P" else character.upper()))
+                else:
+                    raise ValueError("Unknown piece '" + character + "' in FEN: " + fen)
+            if len(row) != 8:
+                raise ValueError("FEN rank '" + rank + "' isn't 8 squares long: " + fen)
+            self.board.append(row)
+        kings = {self.board[row][column]: (row, column) for row in range(8) for column in range(8) if self.board[row][column][1] == "K"}
+        if "wK" not in kings or "bK" not in kings:
+            raise ValueError("FEN needs a king of each color: " + fen)
+
+        if fields[1] not in ("w", "b"):
+            raise ValueError("FEN side to move must be 'w' or 'b': " + fen)
+        self.whiteToMove = fields[1] == "w"
         self.moveLog = []
+        self.startFEN = fen # the position moveLog starts from
 
-        self.whiteKingLocation = (7, 4)
-        self.blackKingLocation = (0, 4)
+        self.whiteKingLocation = kings["wK"]
+        self.blackKingLocation = kings["bK"]
+        enemyKingRow, enemyKingColumn = kings["bK"] if self.whiteToMove else kings["wK"]
+        if self.isSquareAttacked(enemyKingRow, enemyKingColumn, fields[1]): # the king could be taken, no game gets there
+            raise ValueError("FEN side not to move is in check: " + fen)
         self.checkMate = False
         self.staleMate = False
 
-        self.enPassantPossible = () # square where en passant capture can happen
-        self.enPassantPossibleLog = [self.enPassantPossible]
-        self.currentCastlingRights = CastleRights(True, True, True, True)
-        self.castleRightsLog = [CastleRights(self.currentCastlingRights.wks, self.currentCastlingRights.bks, self.currentCastlingRights.wqs, self.currentCastlingRights.bqs)]
-        
+        if fields[3] == "-":
+            self.enPassantPossible = () # square where en passant capture can happen
+        elif len(fields[3]) == 2 and fields[3][0] in Move.files2Cols and fields[3][1] in ("3", "6"):
+            self.enPassantPossible = (Move.ranks2Rows[fields[3][1]], Move.files2Cols[fields[3][0]])
+        else:
+            raise ValueError("Bad en passant square in FEN: " + fen)
+        self.castlingRights = (WHITE_KINGSIDE if "K" in fields[2] else 0) | (BLACK_KINGSIDE if "k" in fields[2] else 0) | \
+            (WHITE_QUEENSIDE if "Q" in fields[2] else 0) | (BLACK_QUEENSIDE if "q" in fields[2] else 0)
+        # a right is lost once its king or rook has left its home square, whatever the FEN says
+        for right, row, rookColumn, color in ((WHITE_KINGSIDE, 7, 7, 'w'), (WHITE_QUEENSIDE, 7, 0, 'w'), (BLACK_KINGSIDE, 0, 7, 'b'), (BLACK_QUEENSIDE, 0, 0, 'b')):
+            if self.board[row][4] != color + 'K' or self.board[row][rookColumn] != color + 'R':
+                self.castlingRights &= ~right
+
+        # halfmoves since the last capture or pawn move (fifty-move rule) and the number of the full move
+        self.halfmoveClock = int(fields[4]) if len(fields) > 4 else 0
+        self.fullmoveNumber = int(fields[5]) if len(fields) > 5 else 1
+
+        self.zobristKey = self.computeZobristKey()
+        self.targetMask, self.pinMasks = ALL_SQUARES, {} # set up for every position by setUpMoveMasks
+        self.moveMasksKey = None # position the masks belong to
+        self.attackMapKey = None # position the cached getAttackMap() belongs to
+
+        # evaluation terms, positive is good for white: material in pawns and piece position scores
+        self.materialScore, self.positionScore = self.computeScores()
+
+        # undo stack, one record per move in moveLog of the state the move can't be undone without:
+        # (enPassantPossible, castlingRights, halfmoveClock, zobristKey, materialScore, positionScore) before the move
+        self.stateLog = []
+
+    def getFEN(self):
+        '''The current position as a FEN string'''
+        ranks = []
+        for row in self.board:
+            rank = ""
+            empty = 0
+            for square in row:
+                if square == "--":
+                    empty += 1
+                    continue
+                if empty:
+                    rank += str(empty)
+                    empty = 0
+                piece = "P" if square[1] == "p" else square[1]
+                rank += piece if square[0] == "w" else piece.lower()
+            if empty:
+                rank += str(empty)
+            ranks.append(rank)
+        castling = "".join(letter for letter, right in (("K", WHITE_KINGSIDE), ("Q", WHITE_QUEENSIDE), ("k", BLACK_KINGSIDE), ("q", BLACK_QUEENSIDE))
+                           if self.castlingRights & right)
+        enPassant = Move.cols2Files[self.enPassantPossible[1]] + Move.rows2Ranks[self.enPassantPossible[0]] if self.enPassantPossible else "-"
+        return " ".join(["/".join(ranks), "w" if self.whiteToMove else "b", castling or "-", enPassant, str(self.halfmoveClock), str(self.fullmoveNumber)])
+
+    def computeScores(self):
+        '''Material and piece position totals computed from scratch, makeMove/undoMove keep them up to date'''
+        materialScore = positionScore = 0
+        for row in range(8):
+            for column in range(8):
+                square = self.board[row][column]
+                if square != "--":
+                    sign = 1 if square[0] == 'w' else -1
+                    materialScore += sign * ChessEval.pieceScore[square[1]]
+                    positionScore += sign * ChessEval.pieceSquareScores[square][row * 8 + column]
+        return materialScore, positionScore
+
+    def computeZobristKey(self):
+        '''Hash of the current position computed from scratch, makeMove/undoMove keep self.zobristKey up to date'''
+        key = 0
+        for row in range(8):
+            for column in range(8):
+                square = self.board[row][column]
+                if square != "--":
+                    key ^= ZOBRIST_PIECES[square][row * 8 + column]
+        if not self.whiteToMove:
+            key ^= ZOBRIST_BLACK_TO_MOVE
+        key ^= ZOBRIST_CASTLING[self.castlingRights]
+        if self.enPassantPossible:
+            key ^= ZOBRIST_EN_PASSANT[self.enPassantPossible[1]]
+        return key
 
     def makeMove(self, move):
         '''Takes a move and execute it, rule's exceptions: castling, en passant, pawn promotion'''
+        previousEnPassant = self.enPassantPossible
+        previousCastlingRights = self.castlingRights
+        self.stateLog.append((previousEnPassant, previousCastlingRights, self.halfmoveClock, self.zobristKey, self.materialScore, self.positionScore))
         self.board[move.startRow][move.startColumn] = "--"
         self.board[move.endRow][move.endColumn] = move.pieceMoved
         self.moveLog.append(move) # log the move so we can undo it later if needed
         self.whiteToMove = not self.whiteToMove # switch turns
+        if move.pieceMoved[1] == 'p' or move.isCapture:
+            self.halfmoveClock = 0
+        else:
+            self.halfmoveClock += 1
+        if self.whiteToMove: # black just moved
+            self.fullmoveNumber += 1
         
         # Update the king's location if moved
         if move.pieceMoved == 'wK':
@@ -50,7 +198,7 @@ class GameState():
             """ promotedPiece = input("Promote to Q, R, B, or N:")
             self.board[move.endRow][move.endColumn] = move.pieceMoved[0] + promotedPiece """
             # just promote to queen:
-            self.board[move.endRow][move.endColumn] = move.pieceMoved[0] + "Q"
+            self.board[move.endRow][move.endColumn] = move.pieceMoved[0] + move.promotionPiece
         
         # enpassant move
         if move.enPassant:
@@ -70,19 +218,75 @@ class GameState():
             elif move.endColumn - move.startColumn == -2: # queenside
                 self.board[move.endRow][move.endColumn + 1] = self.board[move.endRow][move.endColumn -2] # moving R
                 self.board[move.endRow][move.endColumn - 2 ] = '--' # empty 
-        
-        self.enPassantPossibleLog.append(self.enPassantPossible)
 
-        # update castling rights
-        self.updateCastleRights(move)
-        self.castleRightsLog.append(CastleRights(self.currentCastlingRights.wks, self.currentCastlingRights.bks, self.currentCastlingRights.wqs, self.currentCastlingRights.bqs))
+        # update castling rights, moving from or capturing on a king or rook square loses them
+        self.castlingRights &= CASTLING_RIGHTS_KEPT[move.startRow * 8 + move.startColumn] & CASTLING_RIGHTS_KEPT[move.endRow * 8 + move.endColumn]
+
+        # update the hash with only what the move changed
+        key = self.zobristKey ^ ZOBRIST_BLACK_TO_MOVE
+        key ^= ZOBRIST_PIECES[move.pieceMoved][move.startRow * 8 + move.startColumn]
+        key ^= ZOBRIST_PIECES[self.board[move.endRow][move.endColumn]][move.endRow * 8 + move.endColumn] # promoted piece included
+        if move.enPassant:
+            key ^= ZOBRIST_PIECES[move.pieceCaptured][move.startRow * 8 + move.endColumn]
+        elif move.pieceCaptured != "--":
+            key ^= ZOBRIST_PIECES[move.pieceCaptured][move.endRow * 8 + move.endColumn]
+        if move.castle:
+            rook = move.pieceMoved[0] + "R"
+            if move.endColumn - move.startColumn == 2: # kingside
+                key ^= ZOBRIST_PIECES[rook][move.endRow * 8 + move.endColumn + 1] ^ ZOBRIST_PIECES[rook][move.endRow * 8 + move.endColumn - 1]
+            else: # queenside
+                key ^= ZOBRIST_PIECES[rook][move.endRow * 8 + move.endColumn - 2] ^ ZOBRIST_PIECES[rook][move.endRow * 8 + move.endColumn + 1]
+        if previousEnPassant:
+            key ^= ZOBRIST_EN_PASSANT[previousEnPassant[1]]
+        if self.enPassantPossible:
+            key ^= ZOBRIST_EN_PASSANT[self.enPassantPossible[1]]
+        key ^= ZOBRIST_CASTLING[previousCastlingRights] ^ ZOBRIST_CASTLING[self.castlingRights]
+        self.zobristKey = key
+
+        # update the evaluation the same way, captured pieces count for the side that took them
+        sign = 1 if move.pieceMoved[0] == 'w' else -1
+        positionScores = ChessEval.pieceSquareScores
+        placedPiece = self.board[move.endRow][move.endColumn]
+        materialScore = self.materialScore
+        positionScore = self.positionScore + sign * (positionScores[placedPiece][move.endRow * 8 + move.endColumn] - positionScores[move.pieceMoved][move.startRow * 8 + move.startColumn])
+        if move.pieceCaptured != "--":
+            capturedSquare = move.startRow * 8 + move.endColumn if move.enPassant else move.endRow * 8 + move.endColumn
+            materialScore += sign * ChessEval.pieceScore[move.pieceCaptured[1]]
+            positionScore += sign * positionScores[move.pieceCaptured][capturedSquare]
+        if move.pawnPromotion:
+            materialScore += sign * (ChessEval.pieceScore[placedPiece[1]] - ChessEval.pieceScore['p'])
+        if move.castle:
+            rook = positionScores[move.pieceMoved[0] + "R"]
+            if move.endColumn - move.startColumn == 2: # kingside
+                positionScore += sign * (rook[move.endRow * 8 + move.endColumn - 1] - rook[move.endRow * 8 + move.endColumn + 1])
+            else: # queenside
+                positionScore += sign * (rook[move.endRow * 8 + move.endColumn + 1] - rook[move.endRow * 8 + move.endColumn - 2])
+        self.materialScore, self.positionScore = materialScore, positionScore
+
 
+    def makeNullMove(self):
+        '''Pass the turn without moving, for null-move pruning in the search. It goes into the move log as None, so
+        undoMove takes it back like any other move'''
+        self.stateLog.append((self.enPassantPossible, self.castlingRights, self.halfmoveClock, self.zobristKey, self.materialScore, self.positionScore))
+        self.moveLog.append(None)
+        self.whiteToMove = not self.whiteToMove
+        self.zobristKey ^= ZOBRIST_BLACK_TO_MOVE
+        if self.enPassantPossible: # the chance to take en passant is gone after any move
+            self.zobristKey ^= ZOBRIST_EN_PASSANT[self.enPassantPossible[1]]
+            self.enPassantPossible = ()
 
     def undoMove(self):
         '''Undo the last move made'''
         if len(self.moveLog) != 0:
             self.whiteToMove = not self.whiteToMove
             move = self.moveLog.pop()
+            self.enPassantPossible, self.castlingRights, self.halfmoveClock, self.zobristKey, self.materialScore, self.positionScore = self.stateLog.pop()
+            if move is None: # null move, nothing on the board changed
+                self.checkMate = False
+                self.staleMate = False
+                return
+            if not self.whiteToMove: # black's move was taken back
+                self.fullmoveNumber -= 1
             self.board[move.startRow][move.startColumn] = move.pieceMoved
             self.board[move.endRow][move.endColumn] = move.pieceCaptured
             # Undo the king's location if moved
@@ -93,109 +297,40 @@ class GameState():
             # Undo enpassant
             if move.enPassant:
                 self.board[move.endRow][move.endColumn] = '--' # removes the pawn that was added in the wrong squares
-                self.baord[move.startRow][move.endColumn] = move.pieceCaptured # puts the pawn back on the correct square it was captured from
-            self.enPassantPossibleLog.pop()
-            self.enPassantPossible = self.enPassantPossibleLog[-1]
-
-            # give back castle rights if move took them away
-            self.castleRightsLog.pop() # remove last moves updates
-            castleRights = self.castleRightsLog[-1]
-            self.currentCastlingRights = CastleRights(
-                castleRights.wks, castleRights.bks, castleRights.wqs, castleRights.bqs
-            )
+                self.board[move.startRow][move.endColumn] = move.pieceCaptured # puts the pawn back on the correct square it was captured from
             # undo castle
-        if move.castle:
-            if move.endColumn - move.startColumn == 2: # kingside
-                self.board[move.endRow][move.endColumn + 1] = self.board[move.endRow][move.endColumn - 1] # moving back R
-                self.board[move.endRow][move.endColumn + 1] = '--' # empty square where R was
-            elif move.endColumn - move.startColumn == -2: # queenside
-                self.board[move.endRow][move.endColumn - 2] = self.board[move.endRow][move.endColumn + 1] # moving back R
-                self.board[move.endRow][move.endColumn + 1 ] = '--' # empty 
-
-        self.checkmate = False
-        self.stalemate = False
-
-    def updateCastleRights(self, move):
-        '''Update the castle rights given the move'''
-        # if a rook is captured
-        if move.pieceCaptured == "wR":
-            if move.endColumn == 7:
-                if move.endColumn == 0:  # left rook
-                    self.currentCastlingRights.wqs = False
-                elif move.endColumn == 7:  # right rook
-                    self.currentCastlingRights.wks = False
-        elif move.pieceCaptured == "bR":
-            if move.endRow == 0:
-                if move.endColumn == 0:  # left rook
-                    self.currentCastlingRights.bqs = False
-                elif move.endColumn == 7:  # right rook
-                    self.currentCastlingRights.bks = False
-        # else
-        if move.pieceMoved == 'wK':
-            self.currentCastlingRights.wqs = False
-            self.currentCastlingRights.wks = False
-        elif move.pieceMoved == 'bK':
-            self.currentCastlingRights.bqs = False
-            self.currentCastlingRights.bks = False
-        elif move.pieceMoved == 'wR':
-            if move.startRow == 7:
-                if move.startColumn == 0:  # left rook
-                    self.currentCastlingRights.wqs = False
-                elif move.startColumn == 7:  # right rook
-                    self.currentCastlingRights.wks = False
-        elif move.pieceMoved == 'bR':
-            if move.startRow == 0:
-                if move.startColumn == 0:  # left rook
-                    self.currentCastlingRights.bqs = False
-                elif move.startColumn == 7:  # right rook
-                    self.currentCastlingRights.bks = False
-        
-
+            if move.castle:
+                if move.endColumn - move.startColumn == 2: # kingside
+                    self.board[move.endRow][move.endColumn + 1] = self.board[move.endRow][move.endColumn - 1] # moving back R
+                    self.board[move.endRow][move.endColumn - 1] = '--' # empty square where R was
+                elif move.endColumn - move.startColumn == -2: # queenside
+                    self.board[move.endRow][move.endColumn - 2] = self.board[move.endRow][move.endColumn + 1] # moving back R
+                    self.board[move.endRow][move.endColumn + 1 ] = '--' # empty 
 
-    def getValidMoves(self):
-        '''All moves considering checks'''
+        self.checkMate = False
+        self.staleMate = False
 
-        tempCastleRights = CastleRights(self.currentCastlingRights.wks, self.currentCastlingRights.bks, self.currentCastlingRights.wqs, self.currentCastlingRights.bqs)
+    def getValidMoves(self, moves = None):
+        '''All moves considering checks. A list passed in as moves is cleared and filled instead of making a new one.
+        Check evasions and pins are masks the piece generators test every end square against, so an illegal move is
+        never created only to be thrown away'''
 
-        moves = []
-        self.check, self.pins, self.checks = self.checkForPinsAndChecks()
+        if moves is None:
+            moves = []
+        else:
+            moves.clear()
+        self.setUpMoveMasks()
 
         if self.whiteToMove:
-            kingRow = self.whiteKingLocation[0]
-            kingCol = self.whiteKingLocation[1]
+            kingRow, kingCol = self.whiteKingLocation
         else:
-            kingRow = self.blackKingLocation[0]
-            kingCol = self.blackKingLocation[1]
-        if self.check:
-            if len(self.checks) == 1:
-                moves = self.getAllPossibleMoves()
-                check = self.checks[0]
-                checkRow = check[0]
-                checkCol = check[1]
-                pieceChecking = self.board[checkRow][checkCol]
-                validSquares = []
-
-                if pieceChecking[1] == 'N':
-                    validSquares = [(checkRow, checkCol)]
-                else:
-                    for i in range(1, 8):
-                        validSquare = (kingRow + check[2] * i, kingCol + check[3] * i)
-                        validSquares.append(validSquare)
-                        if validSquare[0] == checkRow and validSquare[1] == checkCol:
-                            break
-                
-                for i in range(len(moves) - 1, -1, -1):
-                    if moves[i].pieceMoved[1] != 'K':
-                        if not (moves[i].endRow, moves[i].endColumn) in validSquares:
-                            moves.remove(moves[i])
-            else: # double check, king has to move
-                self.getKingMoves(kingRow, kingCol, moves)
-        else: # not in check
-            moves = self.getAllPossibleMoves()
-            if self.whiteToMove:
-                self.getCastleMoves(self.whiteKingLocation[0], self.whiteKingLocation[1], moves)
-            else:
-                self.getCastleMoves(self.blackKingLocation[0], self.blackKingLocation[1], moves)
+            kingRow, kingCol = self.blackKingLocation
+        if self.check and len(self.checks) > 1: # double check, king has to move
+            self.getKingMoves(kingRow, kingCol, moves)
+        else:
+            self.getAllPossibleMoves(moves)
+            if not self.check:
+                self.getCastleMoves(kingRow, kingCol, moves)
 
         if len(moves) == 0:
             if self.check:
@@ -206,10 +341,224 @@ class GameState():
             self.checkMate = False
             self.staleMate = False
 
-        self.currentCastlingRights = tempCastleRights
         return moves
-    
-    
+
+    def setUpMoveMasks(self):
+        '''Find the checks and pins of the side to move and turn them into masks: targetMask holds the squares a piece
+        other than the king may move to (all of them, or the checking piece and the squares between it and the king),
+        pinMasks maps the square of each pinned piece to the ray from the king it has to stay on'''
+        if self.moveMasksKey == self.zobristKey:
+            return
+        self.moveMasksKey = self.zobristKey
+        self.check, self.pins, self.checks = self.checkForPinsAndChecks()
+        kingRow, kingCol = self.whiteKingLocation if self.whiteToMove else self.blackKingLocation
+        kingRays = RAY_MASKS[kingRow * 8 + kingCol]
+        self.pinMasks = {(pin[0], pin[1]): kingRays[(pin[2], pin[3])] for pin in self.pins}
+        if not self.check:
+            self.targetMask = ALL_SQUARES
+        elif len(self.checks) > 1:
+            self.targetMask = 0
+        else:
+            checkRow, checkCol, dRow, dCol = self.checks[0]
+            if self.board[checkRow][checkCol][1] == 'N':
+                self.targetMask = 1 << (checkRow * 8 + checkCol)
+            else: # the ray from the king up to the checking piece, without what lies behind it
+                self.targetMask = kingRays[(dRow, dCol)] & ~RAY_MASKS[checkRow * 8 + checkCol][(dRow, dCol)]
+
+    def getPieceMoves(self, row, column, moves = None):
+        '''The legal moves of the piece of the side to move on row, column, castling included for the king'''
+        if moves is None:
+            moves = []
+        else:
+            moves.clear()
+        self.setUpMoveMasks()
+        piece = self.board[row][column]
+        if piece[0] != ('w' if self.whiteToMove else 'b'):
+            return moves
+        if piece[1] == 'K':
+            self.getKingMoves(row, column, moves)
+            if not self.check:
+                self.getCastleMoves(row, column, moves)
+        elif len(self.checks) < 2:
+            self.moveFunctions[piece[1]](row, column, moves)
+        return moves
+
+    def findValidMove(self, move):
+        '''The legal move of this position with the squares and promotion piece of move, a move remembered from some
+        other position such as a hash move or killer, or None. Only the moves of the piece on its start square are made'''
+        if self.board[move.startRow][move.startColumn] != move.pieceMoved:
+            return None
+        for validMove in self.getPieceMoves(move.startRow, move.startColumn):
+            if validMove == move:
+                return validMove
+        return None
+
+    def getStagedMoves(self, hashMove = None, killers = (), scoreMove = None):
+        '''The legal moves in stages, each stage only generated once the moves before it are used up, so a search node
+        that cuts off early never pays for the rest: the hash move, the winning captures and promotions, the killers,
+        the quiet moves and last the losing captures, those of a defended piece worth less than the capturing one.
+        Captures and quiet moves come best scoreMove first. The position has to be the same at every step as it was when
+        the generator started. When it runs out without a move, checkMate or staleMate is set as by getValidMoves'''
+        if hashMove is not None:
+            hashMove = self.findValidMove(hashMove)
+            if hashMove is not None:
+                yield hashMove
+        captures = self.getCaptureMoves([])
+        if scoreMove is not None:
+            captures.sort(key=scoreMove, reverse=True)
+        attacked = self.getAttackMap()
+        pieceScore = ChessEval.pieceScore
+        losingCaptures = []
+        for move in captures:
+            if move == hashMove:
+                continue
+            if move.isCapture and pieceScore[move.pieceCaptured[1]] < pieceScore[move.pieceMoved[1]] and (attacked >> (move.endRow * 8 + move.endColumn)) & 1:
+                losingCaptures.append(move)
+            else:
+                yield move
+        killerMoves = []
+        for killer in killers:
+            if killer is not None and killer != hashMove:
+                killer = self.findValidMove(killer)
+                if killer is not None and not killer.isCapture and not killer.pawnPromotion and killer not in killerMoves:
+                    killerMoves.append(killer)
+                    yield killer
+        quiets = [move for move in self.getQuietMoves([]) if move != hashMove and move not in killerMoves]
+        # every legal move is in one of the stages, so none at all means mate or stalemate
+        noMoves = hashMove is None and not captures and not killerMoves and not quiets
+        self.checkMate = noMoves and self.check
+        self.staleMate = noMoves and not self.check
+        if scoreMove is not None:
+            quiets.sort(key=scoreMove, reverse=True)
+        yield from quiets
+        yield from losingCaptures
+
+    def getCaptureMoves(self, moves = None):
+        '''Only the legal captures and promotions, for the quiescence search. Quiet moves are never created.
+        A list passed in as moves is cleared and filled instead of making a new one'''
+        if moves is None:
+            moves = []
+        else:
+            moves.clear()
+        self.setUpMoveMasks()
+        if self.whiteToMove:
+            allyColor, enemyColor = 'w', 'b'
+        else:
+            allyColor, enemyColor = 'b', 'w'
+        targetMask = self.targetMask
+        knightMoves = ((-2, -1), (-2, 1), (-1, 2), (1, 2), (2, -1), (2, 1), (-1, -2), (1, -2))
+        kingMoves = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+        rookDirections = ((-1, 0), (0, -1), (1, 0), (0, 1))
+        bishopDirections = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+        for row in range(8):
+            for column in range(8):
+                piece = self.board[row][column]
+                if piece[0] != allyColor:
+                    continue
+                if piece[1] == 'K':
+                    attacked = self.getAttackMap()
+                    for m in kingMoves:
+                        endRow, endColumn = row + m[0], column + m[1]
+                        if 0 <= endRow < 8 and 0 <= endColumn < 8 and self.board[endRow][endColumn][0] == enemyColor:
+                            if not (attacked >> (endRow * 8 + endColumn)) & 1:
+                                moves.append(Move((row, column), (endRow, endColumn), self.board))
+                    continue
+                allowed = targetMask & self.pinMasks.get((row, column), ALL_SQUARES)
+                if allowed == 0: # double check, or a pin that leaves no capture
+                    continue
+                if piece[1] == 'p': # at most four moves, so filtering the full pawn generator is cheap
+                    pawnMoves = []
+                    self.getPawnMoves(row, column, pawnMoves)
+                    moves.extend(move for move in pawnMoves if move.isCapture or move.pawnPromotion)
+                elif piece[1] == 'N':
+                    if (row, column) not in self.pinMasks:
+                        for m in knightMoves:
+                            endRow, endColumn = row + m[0], column + m[1]
+                            if 0 <= endRow < 8 and 0 <= endColumn < 8 and self.board[endRow][endColumn][0] == enemyColor:
+                                if (allowed >> (endRow * 8 + endColumn)) & 1:
+                                    moves.append(Move((row, column), (endRow, endColumn), self.board))
+                else:
+                    if piece[1] == 'R':
+                        directions = rookDirections
+                    elif piece[1] == 'B':
+                        directions = bishopDirections
+                    else:
+                        directions = rookDirections + bishopDirections
+                    for d in directions:
+                        for i in range(1, 8): # only the first piece met on the ray matters
+                            endRow, endColumn = row + d[0] * i, column + d[1] * i
+                            if not (0 <= endRow < 8 and 0 <= endColumn < 8):
+                                break
+                            endPiece = self.board[endRow][endColumn]
+                            if endPiece != "--":
+                                if endPiece[0] == enemyColor and (allowed >> (endRow * 8 + endColumn)) & 1:
+                                    moves.append(Move((row, column), (endRow, endColumn), self.board))
+                                break
+        return moves
+
+    def getQuietMoves(self, moves = None):
+        '''Only the legal moves that neither capture nor promote, castling included, for the quiet stage of getStagedMoves.
+        Captures are never created. A list passed in as moves is cleared and filled instead of making a new one'''
+        if moves is None:
+            moves = []
+        else:
+            moves.clear()
+        self.setUpMoveMasks()
+        allyColor = 'w' if self.whiteToMove else 'b'
+        targetMask = self.targetMask
+        knightMoves = ((-2, -1), (-2, 1), (-1, 2), (1, 2), (2, -1), (2, 1), (-1, -2), (1, -2))
+        kingMoves = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+        rookDirections = ((-1, 0), (0, -1), (1, 0), (0, 1))
+        bishopDirections = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+        for row in range(8):
+            for column in range(8):
+                piece = self.board[row][column]
+                if piece[0] != allyColor:
+                    continue
+                if piece[1] == 'K':
+                    attacked = self.getAttackMap()
+                    for m in kingMoves:
+                        endRow, endColumn = row + m[0], column + m[1]
+                        if 0 <= endRow < 8 and 0 <= endColumn < 8 and self.board[endRow][endColumn] == "--":
+                            if not (attacked >> (endRow * 8 + endColumn)) & 1:
+                                moves.append(Move((row, column), (endRow, endColumn), self.board))
+                    continue
+                allowed = targetMask & self.pinMasks.get((row, column), ALL_SQUARES)
+                if allowed == 0: # double check, or a pin that leaves no move
+                    continue
+                if piece[1] == 'p': # at most four moves, so filtering the full pawn generator is cheap
+                    pawnMoves = []
+                    self.getPawnMoves(row, column, pawnMoves)
+                    moves.extend(move for move in pawnMoves if not move.isCapture and not move.pawnPromotion)
+                elif piece[1] == 'N':
+                    if (row, column) not in self.pinMasks:
+                        for m in knightMoves:
+                            endRow, endColumn = row + m[0], column + m[1]
+                            if 0 <= endRow < 8 and 0 <= endColumn < 8 and self.board[endRow][endColumn] == "--":
+                                if (allowed >> (endRow * 8 + endColumn)) & 1:
+                                    moves.append(Move((row, column), (endRow, endColumn), self.board))
+                else:
+                    if piece[1] == 'R':
+                        directions = rookDirections
+                    elif piece[1] == 'B':
+                        directions = bishopDirections
+                    else:
+                        directions = rookDirections + bishopDirections
+                    square = row * 8 + column
+                    for d in directions:
+                        if not allowed & RAY_MASKS[square][d]:
+                            continue
+                        for i in range(1, 8): # the empty squares up to the first piece met on the ray
+                            endRow, endColumn = row + d[0] * i, column + d[1] * i
+                            if not (0 <= endRow < 8 and 0 <= endColumn < 8) or self.board[endRow][endColumn] != "--":
+                                break
+                            if (allowed >> (endRow * 8 + endColumn)) & 1:
+                                moves.append(Move((row, column), (endRow, endColumn), self.board))
+        if not self.check: # last, as in getValidMoves
+            kingRow, kingCol = self.whiteKingLocation if self.whiteToMove else self.blackKingLocation
+            self.getCastleMoves(kingRow, kingCol, moves)
+        return moves
+
     def inCheck(self):
         '''Determine if the current player is in check'''
         if self.whiteToMove:
@@ -219,18 +568,95 @@ class GameState():
 
     def squareUnderAttack(self, row, column):
         '''Determine if the enemy can attack the square row, column'''
-        self.whiteToMove = not self.whiteToMove
-        oppMoves = self.getAllPossibleMoves()
-        self.whiteToMove = not self.whiteToMove
-        for move in oppMoves:
-            if move.endRow == row and move.endColumn == column:
-                self.whiteToMove = not self.whiteToMove
+        return self.isSquareAttacked(row, column, 'b' if self.whiteToMove else 'w')
+
+    def isSquareAttacked(self, row, column, attackerColor):
+        '''Determine if a piece of attackerColor attacks the square row, column by looking outward from the square'''
+        board = self.board
+        # a pawn attacks the square from one row back on its own side
+        pawnRow = row - 1 if attackerColor == 'b' else row + 1
+        pawn = attackerColor + 'p'
+        if 0 <= pawnRow < 8 and ((column > 0 and board[pawnRow][column - 1] == pawn) or (column < 7 and board[pawnRow][column + 1] == pawn)):
+            return True
+        knight = attackerColor + 'N'
+        for m in ((-2, -1), (-2, 1), (-1, 2), (1, 2), (2, -1), (2, 1), (-1, -2), (1, -2)):
+            endRow, endColumn = row + m[0], column + m[1]
+            if 0 <= endRow < 8 and 0 <= endColumn < 8 and board[endRow][endColumn] == knight:
+                return True
+        king = attackerColor + 'K'
+        for m in ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)):
+            endRow, endColumn = row + m[0], column + m[1]
+            if 0 <= endRow < 8 and 0 <= endColumn < 8 and board[endRow][endColumn] == king:
                 return True
+        # sliders: only the first piece on each ray can attack the square
+        for directions, slider in ((((-1, 0), (0, -1), (1, 0), (0, 1)), attackerColor + 'R'), (((-1, -1), (-1, 1), (1, -1), (1, 1)), attackerColor + 'B')):
+            queen = attackerColor + 'Q'
+            for d in directions:
+                endRow, endColumn = row + d[0], column + d[1]
+                while 0 <= endRow < 8 and 0 <= endColumn < 8:
+                    endPiece = board[endRow][endColumn]
+                    if endPiece != "--":
+                        if endPiece == slider or endPiece == queen:
+                            return True
+                        break
+                    endRow += d[0]
+                    endColumn += d[1]
         return False
+
+    def getAttackMap(self):
+        '''Squares attacked by the side not to move, as bits row * 8 + column of an int. The king of the side to move is
+        left out as a blocker, so it can't step back along the ray of a slider. Cached until the position changes'''
+        if self.attackMapKey == self.zobristKey:
+            return self.attackMap
+        board = self.board
+        if self.whiteToMove:
+            enemyColor, shieldingKing, pawnDirection = 'b', 'wK', 1
+        else:
+            enemyColor, shieldingKing, pawnDirection = 'w', 'bK', -1
+        rookDirections = ((-1, 0), (0, -1), (1, 0), (0, 1))
+        bishopDirections = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+        sliderDirections = {'R': rookDirections, 'B': bishopDirections, 'Q': rookDirections + bishopDirections}
+        attacked = 0
+        for row in range(8):
+            for column in range(8):
+                piece = board[row][column]
+                if piece[0] != enemyColor:
+                    continue
+                if piece[1] == 'p':
+                    endRow = row + pawnDirection
+                    if 0 <= endRow < 8:
+                        if column > 0:
+                            attacked |= 1 << (endRow * 8 + column - 1)
+                        if column < 7:
+                            attacked |= 1 << (endRow * 8 + column + 1)
+                elif piece[1] == 'N' or piece[1] == 'K':
+                    if piece[1] == 'N':
+                        jumps = ((-2, -1), (-2, 1), (-1, 2), (1, 2), (2, -1), (2, 1), (-1, -2), (1, -2))
+                    else:
+                        jumps = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+                    for m in jumps:
+                        endRow, endColumn = row + m[0], column + m[1]
+                        if 0 <= endRow < 8 and 0 <= endColumn < 8:
+                            attacked |= 1 << (endRow * 8 + endColumn)
+                else:
+                    for d in sliderDirections[piece[1]]:
+                        endRow, endColumn = row + d[0], column + d[1]
+                        while 0 <= endRow < 8 and 0 <= endColumn < 8:
+                            attacked |= 1 << (endRow * 8 + endColumn)
+                            endPiece = board[endRow][endColumn]
+                            if endPiece != "--" and endPiece != shieldingKing:
+                                break
+                            endRow += d[0]
+                            endColumn += d[1]
+        self.attackMap = attacked
+        self.attackMapKey = self.zobristKey
+        return attacked
     
-    def getAllPossibleMoves(self):
-        '''All moves without considering checks'''
-        moves = []
+    def getAllPossibleMoves(self, moves = None):
+        '''All moves but castling within the masks of the last setUpMoveMasks, added to moves if given. Before any
+        masks are set up for the position, that is without considering checks'''
+        if moves is None:
+            moves = []
         for row in range(len(self.board)):
             for column in range(len(self.board[row])):
                 turn = self.board[row][column][0]
@@ -242,15 +668,8 @@ class GameState():
 
     def getPawnMoves(self, row, column, moves):
         '''Get all the pawn moves for the pawn located at row, column and add this move to the list'''
-
-        piecePinned = False
-        pinDirection = ()
-        for i in range(len(self.pins) - 1, -1, -1):
-            if self.pins[i][0] == row and self.pins[i][1] == column:
-                piecePinned = True
-                pinDirection = (self.pins[i][2], self.pins[i][3])
-                self.pins.remove(self.pins[i])
-                break
+        pinMask = self.pinMasks.get((row, column), ALL_SQUARES)
+        allowed = self.targetMask & pinMask
         if self.whiteToMove:
             moveAmount = -1
             startRow = 6
@@ -263,167 +682,116 @@ class GameState():
             backRow = 7
             enemyColor = 'w'
             kingRow, kingColumn = self.blackKingLocation
-        pawnPromotion = False
-
-        if self.board[row+moveAmount][column] == "--": # 1 square move
-            if not piecePinned or pinDirection == (moveAmount, 0):
-                if row + moveAmount == backRow:
-                    pawnPromotion = True
-                moves.append(Move((row, column), (row+moveAmount, column), self.board, pawnPromotion = pawnPromotion))
-                if row == startRow and self.board[row+2*moveAmount][column] == "--": # 2 square moves
-                    moves.append(Move((row, column), (row+2*moveAmount, column), self.board))
-        if column-1 >=0: #capture to left
-            if not piecePinned or pinDirection == (moveAmount, -1):
-                if self.board[row + moveAmount][column-1][0] == enemyColor:
-                    if row + moveAmount == backRow:
-                        pawnPromotion = True
-                    moves.append(Move((row, column), (row+moveAmount, column-1), self.board, pawnPromotion = pawnPromotion))
-                if (row + moveAmount, column - 1) == self.enPassantPossible:
-                    attackingPiece = blockingPiece = False
-                    if kingRow == row:
-                        if kingColumn < column: # king is left of the pawn
-                            # inside between K and p; outside range between p and border
-                            insideRange = range(kingColumn+1, column-1)
-                            outsideRange = range(column+1, 8)
-                        else: # K right of the p
-                            insideRange = range(kingColumn-1, column, -1)
-                            outsideRange = range(column-2, -1, -1)
-                        for i in insideRange:
-                            if self.board[row][i] != "--": # some other piece beside en-passant pawn blocks
-                                blockingPiece = True
-                        for i in outsideRange:
-                            square = self.board[row][i]
-                            if square[0] == enemyColor and (square[1] == 'R' or square[1] == 'Q'): # attacking piece
-                                attackingPiece = True
-                            elif square != "--":
-                                blockingPiece = True
-                    if not attackingPiece or blockingPiece:
-                        moves.append(Move((row, column), (row+moveAmount, column-1), self.board, enPassant=True))
-        if column+1 <= 7:
-            if not piecePinned or pinDirection == (moveAmount, 1):
-                if self.board[row + moveAmount][column+1][0] == enemyColor:
-                    if row + moveAmount == backRow:
-                        pawnPromotion = True
-                    moves.append(Move((row, column), (row+moveAmount, column+1), self.board, pawnPromotion = pawnPromotion))
-                if (row + moveAmount, column + 1) == self.enPassantPossible:
-                    attackingPiece = blockingPiece = False
-                    if kingRow == row:
-                        if kingColumn < column: # king is left of the pawn
-                            # inside between K and p; outside range between p and border
-                            insideRange = range(kingColumn+1, column)
-                            outsideRange = range(column+2, 8)
-                        else: # K right of the p
-                            insideRange = range(kingColumn-1, column+1, -1)
-                            outsideRange = range(column-1, -1, -1)
-                        for i in insideRange:
-                            if self.board[row][i] != "--": # some other piece beside en-passant pawn blocks
-                                blockingPiece = True
-                        for i in outsideRange:
-                            square = self.board[row][i]
-                            if square[0] == enemyColor and (square[1] == 'R' or square[1] == 'Q'): # attacking piece
-                                attackingPiece = True
-                            elif square != "--":
-                                blockingPiece = True
-                    if not attackingPiece or blockingPiece:
-                        moves.append(Move((row, column), (row+moveAmount, column+1), self.board, enPassant=True))
+        endRow = row + moveAmount
+        pawnPromotion = endRow == backRow
+
+        if self.board[endRow][column] == "--": # 1 square move
+            if (allowed >> (endRow * 8 + column)) & 1:
+                self.addPawnMoves((row, column), (endRow, column), moves, pawnPromotion)
+            if row == startRow and self.board[endRow + moveAmount][column] == "--" and (allowed >> ((endRow + moveAmount) * 8 + column)) & 1: # 2 square moves
+                moves.append(Move((row, column), (endRow + moveAmount, column), self.board))
+        for endColumn in (column - 1, column + 1): # captures to the left and right
+            if not 0 <= endColumn < 8:
+                continue
+            if self.board[endRow][endColumn][0] == enemyColor and (allowed >> (endRow * 8 + endColumn)) & 1:
+                self.addPawnMoves((row, column), (endRow, endColumn), moves, pawnPromotion)
+            if (endRow, endColumn) == self.enPassantPossible and (pinMask >> (endRow * 8 + endColumn)) & 1:
+                # in check, taking the checking pawn en passant answers the check too
+                if not (self.targetMask >> (endRow * 8 + endColumn)) & 1 and not (self.targetMask >> (row * 8 + endColumn)) & 1:
+                    continue
+                attackingPiece = blockingPiece = False
+                if kingRow == row: # both pawns leave the king's row, a rook or queen behind them may then see the king
+                    if kingColumn < column: # king is left of the pawns
+                        # inside between K and p; outside range between p and border
+                        insideRange = range(kingColumn + 1, min(column, endColumn))
+                        outsideRange = range(max(column, endColumn) + 1, 8)
+                    else: # K right of the p
+                        insideRange = range(kingColumn - 1, max(column, endColumn), -1)
+                        outsideRange = range(min(column, endColumn) - 1, -1, -1)
+                    for i in insideRange:
+                        if self.board[row][i] != "--": # some other piece beside en-passant pawn blocks
+                            blockingPiece = True
+                    for i in outsideRange:
+                        square = self.board[row][i]
+                        if square[0] == enemyColor and (square[1] == 'R' or square[1] == 'Q'): # attacking piece
+                            attackingPiece = True
+                            break
+                        elif square != "--":
+                            blockingPiece = True
+                            break
+                if not attackingPiece or blockingPiece:
+                    moves.append(Move((row, column), (endRow, endColumn), self.board, enPassant=True))
+
 
+    def addPawnMoves(self, startSq, endSq, moves, pawnPromotion):
+        '''Add a pawn move, or one move per promotion piece when the pawn reaches the back row'''
+        if pawnPromotion:
+            for piece in PROMOTION_PIECES:
+                moves.append(Move(startSq, endSq, self.board, pawnPromotion = True, promotionPiece = piece))
+        else:
+            moves.append(Move(startSq, endSq, self.board))
 
     def getRookMoves(self, row, column, moves):
         '''Get all the rook moves for the rook located at row, column and add this move to the list'''
-        piecePinned = False
-        pinDirection = ()
-        for i in range(len(self.pins) - 1, -1, -1):
-            if self.pins[i][0] == row and self.pins[i][1] == column:
-                piecePinned = True
-                pinDirection = (self.pins[i][2], self.pins[i][3])
-                if self.board[row][column][1] != 'Q': # can't remove Q from pin on R moves, only remove it on B moves
-                    self.pins.remove(self.pins[i])
-                break
-        
-        directions = ((-1, 0), (0, -1), (1, 0), (0, 1))
-        if self.whiteToMove:
-            enemyColor = "b"
-        else:
-            enemyColor = "w"
-        for d in directions:
-            for i in range(1, 8):
-                endRow = row + d[0] * i
-                endColumn = column + d[1] * i
-                if 0 <= endRow < 8 and 0 <= endColumn < 8:
-                    if not piecePinned or pinDirection == d or pinDirection == (-d[0], -d[1]):    
-                        endPiece = self.board[endRow][endColumn]
-                        if endPiece == "--":
-                            moves.append(Move((row, column), (endRow, endColumn), self.board))
-                        elif endPiece[0] == enemyColor: 
-                            moves.append(Move((row, column), (endRow, endColumn), self.board))
-                            break
-                        else:
-                            break
-                else:
-                    break
+        self.getSlidingMoves(row, column, ((-1, 0), (0, -1), (1, 0), (0, 1)), moves)
 
-    
     def getKnightMoves(self, row, column, moves):
-        '''Get all the rook moves for the knight located at row, column and add this move to the list'''
-        piecePinned = False
-        for i in range(len(self.pins) - 1, -1, -1):
-            if self.pins[i][0] == row and self.pins[i][1] == column:
-                piecePinned = True
-                self.pins.remove(self.pins[i])
-                break
-        
+        '''Get all the knight moves for the knight located at row, column and add this move to the list'''
+        if (row, column) in self.pinMasks: # a pinned knight can never move
+            return
         knightMoves = ((-2, -1), (-2, 1), (-1, 2), (1, 2), (2, -1), (2, 1), (-1, -2), (1, -2))
         if self.whiteToMove:
             allyColor = "w"
-        else:   
+        else:
             allyColor = "b"
+        allowed = self.targetMask
         for m in knightMoves:
             endRow = row + m[0]
             endColumn = column + m[1]
-            if 0 <= endRow < 8 and 0 <= endColumn < 8:
-                if not piecePinned:
-                    endPiece = self.board[endRow][endColumn]
-                    if endPiece[0] != allyColor:
-                        moves.append(Move((row, column), (endRow, endColumn), self.board))
+            if 0 <= endRow < 8 and 0 <= endColumn < 8 and (allowed >> (endRow * 8 + endColumn)) & 1:
+                endPiece = self.board[endRow][endColumn]
+                if endPiece[0] != allyColor:
+                    moves.append(Move((row, column), (endRow, endColumn), self.board))
 
     def getBishopMoves(self, row, column, moves):
-        '''Get all the rook moves for the bishop located at row, column and add this move to the list'''
-        piecePinned = False
-        pinDirection = ()
-        for i in range(len(self.pins) - 1, -1, -1):
-            if self.pins[i][0] == row and self.pins[i][1] == column:
-                piecePinned = True
-                pinDirection = (self.pins[i][2], self.pins[i][3])
-                self.pins.remove(self.pins[i])
-                break
-        
-        directions = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+        '''Get all the bishop moves for the bishop located at row, column and add this move to the list'''
+        self.getSlidingMoves(row, column, ((-1, -1), (-1, 1), (1, -1), (1, 1)), moves)
+
+    def getQueenMoves(self, row, column, moves):
+        '''Get all the queen moves for the queen located at row, column and add this move to the list'''
+        self.getSlidingMoves(row, column, ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1)), moves)
+
+    def getSlidingMoves(self, row, column, directions, moves):
+        '''Moves of a rook, bishop or queen at row, column along directions, within the check and pin masks'''
+        pinMask = self.pinMasks.get((row, column))
+        allowed = self.targetMask if pinMask is None else self.targetMask & pinMask
+        if allowed == 0:
+            return
         if self.whiteToMove:
             enemyColor = "b"
-        else:   
+        else:
             enemyColor = "w"
+        square = row * 8 + column
         for d in directions:
+            if not allowed & RAY_MASKS[square][d]: # pinned across this ray, or no block or capture of the checker on it
+                continue
             for i in range(1, 8):
                 endRow = row + d[0] * i
                 endColumn = column + d[1] * i
-                if 0 <= endRow < 8 and 0 <= endColumn < 8: 
-                    if not piecePinned or pinDirection == d or pinDirection == (-d[0], -d[1]):        
-                        endPiece = self.board[endRow][endColumn]
-                        if endPiece == "--":
+                if 0 <= endRow < 8 and 0 <= endColumn < 8:
+                    endPiece = self.board[endRow][endColumn]
+                    if endPiece == "--":
+                        if (allowed >> (endRow * 8 + endColumn)) & 1:
                             moves.append(Move((row, column), (endRow, endColumn), self.board))
-                        elif endPiece[0] == enemyColor: 
+                    elif endPiece[0] == enemyColor:
+                        if (allowed >> (endRow * 8 + endColumn)) & 1:
                             moves.append(Move((row, column), (endRow, endColumn), self.board))
-                            break
-                        else:
-                            break
+                        break
+                    else:
+                        break
                 else:
                     break
 
-    def getQueenMoves(self, row, column, moves):
-        '''Get all the rook moves for the queen located at row, column and add this move to the list'''
-        self.getRookMoves(row, column, moves)
-        self.getBishopMoves(row, column, moves)
-
     def getKingMoves(self, row, column, moves):
         '''Get all the rook moves for the king located at row, column and add this move to the list'''
         kingMoves = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
@@ -432,41 +800,32 @@ class GameState():
             allyColor = "w"
         else:   
             allyColor = "b"
+        attacked = self.getAttackMap()
         for i in range(8):
             endRow = row + kingMoves[i][0]
             endColumn = column + kingMoves[i][1]
             if 0 <= endRow < 8 and 0 <= endColumn < 8: 
                 endPiece = self.board[endRow][endColumn]
-                if endPiece[0] != allyColor:
-                    if allyColor == 'w':
-                        self.blackKingLocation = (endRow, endColumn)
-                    else:
-                        self.whiteKingLocation = (endRow, endColumn)
-                    check, pins, checks = self.checkForPinsAndChecks()
-                    if not check:
-                        moves.append(Move((row, column), (endRow, endColumn), self.board))
-                    if allyColor == 'w':
-                        self.blackKingLocation = (row, column)
-                    else:
-                        self.whiteKingLocation = (row, column)
+                if endPiece[0] != allyColor and not (attacked >> (endRow * 8 + endColumn)) & 1:
+                    moves.append(Move((row, column), (endRow, endColumn), self.board))
 
     def getCastleMoves(self, row, column, moves):
         '''Generate all valid castle moves for the king at (row, column) and add them to the list of moves.'''
-        if self.inCheck():
+        if (self.getAttackMap() >> (row * 8 + column)) & 1: # no castling out of check
             return
-        if (self.whiteToMove and self.currentCastlingRights.wks) or (not self.whiteToMove and self.currentCastlingRights.bks):
+        if self.castlingRights & (WHITE_KINGSIDE if self.whiteToMove else BLACK_KINGSIDE):
             self.getKingsideCastleMoves(row, column, moves)
-        if (self.whiteToMove and self.currentCastlingRights.wqs) or (not self.whiteToMove and self.currentCastlingRights.bqs):
+        if self.castlingRights & (WHITE_QUEENSIDE if self.whiteToMove else BLACK_QUEENSIDE):
             self.getQueensideCastleMoves(row, column, moves)
 
     def getKingsideCastleMoves(self, row, column, moves):
         if self.board[row][column + 1] == "--" and self.board[row][column + 2] == "--":
-            if not self.squareUnderAttack(row, column + 1) and not self.squareUnderAttack(row, column + 2):
+            if not (self.getAttackMap() >> (row * 8 + column + 1)) & 3: # the king may not pass through or land on an attacked square
                 moves.append(Move((row, column), (row, column + 2), self.board, castle=True))
 
     def getQueensideCastleMoves(self, row, column, moves):
         if self.board[row][column - 1] == "--" and self.board[row][column - 2] == "--" and self.board[row][column - 3] == "--":
-            if not self.squareUnderAttack(row, column - 1) and not self.squareUnderAttack(row, column - 2):
+            if not (self.getAttackMap() >> (row * 8 + column - 2)) & 3:
                 moves.append(Move((row, column), (row, column - 2), self.board, castle=True))
 
 
@@ -533,18 +892,9 @@ class GameState():
                 if endPiece[0] == enemyColor and endPiece[1] == 'N':
                     check = True
                     checks.append((endRow, endColumn, m[0], m[1]))
-            else:
-                break
         return check, pins, checks
 
 
-class CastleRights:
-    def __init__(self, wks, bks, wqs, bqs):
-        self.wks = wks
-        self.bks = bks
-        self.wqs = wqs
-        self.bqs = bqs
-
 class Move():
     # maps keys to values
     # key: value
@@ -552,24 +902,28 @@ class Move():
     rows2Ranks = {v: k for k, v in ranks2Rows.items()}
     files2Cols = {"a": 0, "b": 1, "c": 2, "d": 3, "e": 4, "f": 5, "g": 6, "h": 7}
     cols2Files = {v: k for k, v in files2Cols.items()}
-    
-    def __init__(self, startSq, endSq, board, enPassant = False, pawnPromotion = False, castle = False):
-        self.startRow = startSq[0]
-        self.startColumn = startSq[1]
+    # no per-move __dict__, moves are created by the thousand in every search
+    __slots__ = ("startRow", "startColumn", "endRow", "endColumn", "pieceMoved", "pieceCaptured", "enPassant", "pawnPromotion",
+                 "promotionPiece", "castle", "isCapture", "moveID")
 
-        self.endRow = endSq[0]
-        self.endColumn = endSq[1]
+    def __init__(self, startSq, endSq, board, enPassant = False, pawnPromotion = False, castle = False, promotionPiece = "Q"):
+        self.startRow, self.startColumn = startRow, startColumn = startSq
+        self.endRow, self.endColumn = endRow, endColumn = endSq
 
-        self.pieceMoved = board[self.startRow][self.startColumn]
-        self.pieceCaptured = board[self.endRow][self.endColumn]
+        self.pieceMoved = board[startRow][startColumn]
+        self.pieceCaptured = board[endRow][endColumn]
 
         self.enPassant = enPassant
         self.pawnPromotion = pawnPromotion
+        self.promotionPiece = promotionPiece
         self.castle = castle
         if enPassant:
             self.pieceCaptured = 'bp' if self.pieceMoved == 'wp' else 'wp' # enpassant captures opposite colored pawn
         self.isCapture = self.pieceCaptured != "--"
-        self.moveID = self.startRow * 1000 + self.startColumn * 100 + self.endRow * 10 + self.endColumn 
+        # packed into one int: start square in bits 0-5, end square in bits 6-11, promotion piece in bits 12-13
+        self.moveID = (startRow << 3 | startColumn) | (endRow << 3 | endColumn) << 6
+        if pawnPromotion: # a queen promotion keeps the plain id, so it equals the move built from two clicks
+            self.moveID |= PROMOTION_INDEX[promotionPiece] << 12
 
     def __eq__(self, other):
         '''Overriding the equals method'''
@@ -577,10 +931,16 @@ class Move():
             return self.moveID == other.moveID
         return False
 
+    def __hash__(self):
+        return self.moveID
+
 
     def getChessNotation(self):
         # TODO: Adding real chess notation
-        return self.getRankFile(self.startRow, self.startColumn) + self.getRankFile(self.endRow, self.endColumn)
+        notation = self.getRankFile(self.startRow, self.startColumn) + self.getRankFile(self.endRow, self.endColumn)
+        if self.pawnPromotion:
+            notation += self.promotionPiece.lower()
+        return notation
 
     def getRankFile(self, r, c):
         return self.cols2Files[c] + self.rows2Ranks[r]
@@ -596,10 +956,13 @@ class Move():
         #pawn moves
         if self.pieceMoved[1] == 'p':
             if self.isCapture:
-                return self.cols2Files[self.startColumn] + 'x' + endSquare
+                moveString = self.cols2Files[self.startColumn] + 'x' + endSquare
             else:
-                return endSquare
+                moveString = endSquare
             #pawn promotions
+            if self.pawnPromotion:
+                moveString += '=' + self.promotionPiece
+            return moveString
         
         #two of the same type of piece moving to a square
         #check move: +; checkmate move:#
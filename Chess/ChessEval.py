@@ -0,0 +1,78 @@
+'''
+Evaluation tables: material value of every piece and position score of every piece on every square. GameState keeps
+its totals of both up to date move by move, and the search and the batch evaluator score positions with them, so they
+live here where all of them can read them without importing each other.
+'''
+
+pieceScore = {'K': 0, 'Q': 9, 'R': 5, 'B': 3, 'N': 3, 'p': 1}
+
+knightScores = [[1, 1, 1, 1, 1, 1, 1, 1],
+                [1, 2, 2, 2, 2, 2, 2, 1],
+                [1, 2, 3, 3, 3, 3, 2, 1],
+                [1, 2, 3, 4, 4, 3, 2, 1],
+                [1, 2, 3, 4, 4, 3, 2, 1],
+                [1, 2, 3, 3, 3, 3, 2, 1],
+                [1, 2, 2, 2, 2, 2, 2, 1],
+                [1, 1, 1, 1, 1, 1, 1, 1]]
+
+bishopScores = [[4, 3, 2, 1, 1, 2, 3, 4],
+                [3, 4, 3, 2, 2, 3, 4, 3],
+                [2, 3, 4, 3, 3, 4, 3, 2],
+                [1, 2, 3, 4, 4, 3, 2, 1],
+                [1, 2, 3, 4, 4, 3, 2, 1],
+                [2, 3, 4, 3, 3, 4, 3, 2],
+                [3, 4, 3, 2, 2, 3, 4, 3],
+                [4, 3, 2, 1, 1, 2, 3, 4]]
+
+queenScores = [[1, 1, 1, 3, 1, 1, 1, 1],
+                [1, 2, 3, 3, 3, 1, 1, 1],
+                [1, 4, 3, 3, 3, 4, 2, 1],
+                [1, 2, 3, 3, 3, 2, 2, 1],
+                [1, 2, 3, 3, 3, 2, 2, 1],
+                [1, 3, 3, 3, 3, 4, 2, 1],
+                [1, 1, 2, 3, 3, 1, 1, 1],
+                [1, 1, 1, 3, 1, 1, 1, 1]]
+
+# rook is better on open files, connected rooks or with queen
+rookScores = [[4, 3, 4, 4, 4, 4, 3, 4],
+                [4, 4, 4, 4, 4, 4, 4, 4],
+                [1, 1, 2, 3, 3, 2, 1, 1],
+                [1, 2, 3, 3, 3, 3, 2, 1],
+                [1, 2, 3, 3, 3, 3, 2, 1],
+                [1, 1, 2, 3, 3, 2, 1, 1],
+                [4, 4, 4, 4, 4, 4, 4, 4],
+                [4, 3, 4, 4, 4, 4, 3, 4]]
+
+whitePawnScores = [[10, 10, 10, 10, 10, 10, 10, 10],
+                [8, 8, 8, 8, 8, 8, 8, 8],
+                [5, 6, 6, 7, 7, 6, 6, 5],
+                [2, 3, 3, 4, 4, 3, 3, 2],
+                [1, 2, 3, 4, 4, 3, 2, 1],
+                [1, 1, 2, 3, 3, 2, 1, 1],
+                [1, 1, 1, 0, 0, 1, 1, 1],
+                [0, 0, 0, 0, 0, 0, 0, 0]]
+
+blackPawnScores = [[0, 0, 0, 0, 0, 0, 0, 0],
+                [1, 1, 1, 0, 0, 1, 1, 1],
+                [1, 1, 2, 3, 3, 2, 1, 1],
+                [1, 2, 3, 4, 4, 3, 2, 1],
+                [2, 3, 3, 4, 4, 3, 3, 2],
+                [5, 6, 6, 7, 7, 6, 6, 5],
+                [8, 8, 8, 8, 8, 8, 8, 8],
+                [10, 10, 10, 10, 10, 10, 10, 10]]
+
+piecePositionScores = {'N': knightScores, 'Q': queenScores, 'B': bishopScores, "R": rookScores, "bp": blackPawnScores, "wp": whitePawnScores}
+
+def buildPieceSquareScores():
+    '''Piece ("wN", "bp", ...) -> position score of each square, indexed by row * 8 + column. No position table for king'''
+    scores = {}
+    for color in "wb":
+        for piece in "pNBRQK":
+            if piece == 'K':
+                scores[color + piece] = [0] * 64
+            else:
+                table = piecePositionScores[color + piece] if piece == 'p' else piecePositionScores[piece]
+                scores[color + piece] = [table[row][column] for row in range(8) for column in range(8)]
+    return scores
+
+pieceSquareScores = buildPieceSquareScores()
@@ -3,8 +3,7 @@ This is a driver file -> It will be responsible for handling user input and disp
 '''
 
 import pygame as p
-import ChessEngine, ChessAI
-from multiprocessing import Process, Queue
+import ChessEngine, ChessAI, ChessBitboard, ChessWorker
 
 BOARD_WIDTH = BOARD_HEIGHT = 512
 MOVE_LOG_PANEL_WIDTH = 256
@@ -12,6 +11,8 @@ MOVE_LOG_PANEL_HEIGHT = BOARD_HEIGHT
 DIMENSION = 8
 SQUARE_SIZE = BOARD_HEIGHT // DIMENSION
 MAX_FPS = 15
+AI_WORKERS = ChessAI.WORKERS # processes searching the AI moves, they keep their tables from move to move
+PONDER = True # search the reply to the move the AI expects from the human while the human thinks
 IMAGES = {}
 
 def loadImages():
@@ -21,12 +22,20 @@ def loadImages():
         IMAGES[piece] = p.transform.scale(p.image.load("Chess/images/" + piece + ".png"), (SQUARE_SIZE, SQUARE_SIZE))
 
 def main():
-    ''' The main driver for our code. This will handle user input and updating the graphics '''
+    ''' The main driver for our code. Runs the game with an engine worker that searches the AI moves for the whole session '''
+    engine = ChessWorker.EngineWorker(AI_WORKERS)
+    try:
+        playGame(engine)
+    finally:
+        engine.close() # also on an error, the worker isn't a daemon and would keep python from exiting
+
+def playGame(engine):
+    ''' This will handle user input and updating the graphics until the window is closed '''
     p.init()
     screen = p.display.set_mode((BOARD_WIDTH + MOVE_LOG_PANEL_WIDTH, BOARD_HEIGHT))
     clock = p.time.Clock()
     screen.fill(p.Color("white"))
-    gs = ChessEngine.GameState()
+    gs = ChessBitboard.BitboardGameState()
 
     moveLogFont = p.font.SysFont("Arial", 14, False, False)
 
@@ -43,8 +52,9 @@ def main():
     playerOne = True # if a human is playing white, then this will be True. if ai is playing -> False
     playerTwo = False # same as playerOne but with black
     AIThinking = False
-    moveFinderProcess = None
     moveUndone = False
+    AIPV = [] # principal variation of the last AI search, its second move is the reply we expect
+    ponderMove = None # the human move the engine is pondering on, if it is
 
     while running:
         humanTurn = (gs.whiteToMove and playerOne) or (not gs.whiteToMove and playerTwo)
@@ -54,6 +64,7 @@ def main():
         for e in p.event.get():
             if e.type == p.QUIT:
                 running = False
+                return
             # Mouse handler
             elif e.type == p.MOUSEBUTTONDOWN:
                 if not gameOver:
@@ -71,12 +82,23 @@ def main():
                         move = ChessEngine.Move(playerClicks[0], playerClicks[1], gs.board)
                         print(move.getChessNotation())
                         for i in range(len(validMoves)):
-                            if move in validMoves:                
-                                gs.makeMove(move)
+                            if move == validMoves[i]: # make the generated move, it knows about castling, en passant and promotion
+                                gs.makeMove(validMoves[i])
+                                if ponderMove is not None:
+                                    if validMoves[i] == ponderMove: # ponder hit, the search already running becomes the AI search
+                                        engine.ponderHit()
+                                        AIThinking = True
+                                        AIMove = None
+                                        AIPV = []
+                                        print("Ponder hit, thinking...")
+                                    else:
+                                        engine.stop()
+                                    ponderMove = None
                                 moveMade = True
                                 animate = True
                                 sqSelected = ()
                                 playerClicks = []
+                                break
                         if not moveMade:
                             playerClicks = [sqSelected]
             # Key handlers
@@ -88,21 +110,22 @@ def main():
                     moveMade = True
                     animate = False
                     gameOver = False
-                    if AIThinking:
-                        moveFinderProcess.terminate()
+                    if AIThinking or ponderMove is not None:
+                        engine.stop()
                         AIThinking = False
+                        ponderMove = None
                     moveUndone = True
                 if e.key == p.K_r: # reset the board when 'r' is pressed
-                    gs = ChessEngine.GameState()
+                    gs = ChessBitboard.BitboardGameState()
                     validMoves = gs.getValidMoves()
                     sqSelected = ()
                     playerClicks = []
                     moveMade = False
                     animate = False
                     gameOver = False
-                    if AIThinking:
-                        moveFinderProcess.terminate()
-                        AIThinking = False
+                    engine.newGame()
+                    AIThinking = False
+                    ponderMove = None
                     moveUndone = True
 
         # ai move finder logic
@@ -110,19 +133,27 @@ def main():
             if not AIThinking:
                 AIThinking = True
                 print("Thinking...")
-                returnQueue = Queue() #pass data between threads
-                moveFinderProcess = Process(target=ChessAI.findBestMove, args=(gs, validMoves, returnQueue))
-                moveFinderProcess.start() #call findBestMove(gs, validMoves, returnQueue)
+                AIMove = None
+                AIPV = []
+                engine.search(gs)
             
-            if not moveFinderProcess.is_alive():
+            results, searchFinished = engine.getResults()
+            for depth, score, pv, nodes in results: # results of every finished depth, the last one is the best
+                AIMove = pv[0]
+                AIPV = pv
+                print("depth", depth, "score", score, "nodes", nodes, "pv", " ".join(str(move) for move in pv))
+
+            if searchFinished:
                 print("Done.")
-                AIMove = returnQueue.get()
                 if AIMove is None:
                     AIMove = ChessAI.findRandomMove(validMoves)
                 gs.makeMove(AIMove)
                 moveMade = True
                 animate = True
                 AIThinking = False
+                humanNext = (gs.whiteToMove and playerOne) or (not gs.whiteToMove and playerTwo)
+                if PONDER and humanNext and len(AIPV) >= 2 and AIPV[0] == AIMove:
+                    ponderMove = startPondering(engine, gs, AIPV[1])
 
         if moveMade:
             if animate:
@@ -145,6 +176,14 @@ def main():
         clock.tick(MAX_FPS)
         p.display.flip()
 
+def startPondering(engine, gs, expectedMove):
+    '''Search the position after expectedMove in the engine worker, on the human's time. Returns expectedMove'''
+    print("Pondering on", expectedMove)
+    gs.makeMove(expectedMove)
+    engine.search(gs, ponder=True) # only the moves are sent, gs can be taken back right away
+    gs.undoMove()
+    return expectedMove
+
 def drawGameState(screen, gs, validMoves, sqSelected, moveLogFont):
     '''Draws the game state'''
     drawBoard(screen) # Drawing board's squares
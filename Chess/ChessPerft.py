@@ -0,0 +1,94 @@
+'''
+Perft: count the leaf nodes of the legal move tree of a position to a fixed depth. The counts of the positions below
+are well known, so any difference points at a bug in getValidMoves/makeMove/undoMove, and the time it takes gives the
+speed of move generation in nodes per second.
+Usage: python Chess/ChessPerft.py [--mailbox] [--depth N] [--fen FEN [--divide]]
+'''
+
+import argparse
+import sys
+import time
+import ChessEngine, ChessBitboard
+
+# name, FEN, node counts at depth 1, 2, 3, ...
+PERFT_POSITIONS = [
+    ("start", "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1", (20, 400, 8902, 197281, 4865609)),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", (48, 2039, 97862, 4085603)),
+    ("position 3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", (14, 191, 2812, 43238, 674624)),
+    ("position 4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1", (6, 264, 9467, 422333)),
+    ("position 5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", (44, 1486, 62379, 2103487)),
+    ("position 6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10", (46, 2079, 89890, 3894594)),
+]
+DEFAULT_DEPTH = 3
+
+
+def perft(gs, depth):
+    '''Number of move sequences of length depth from the current position'''
+    if depth == 0:
+        return 1
+    moves = gs.getValidMoves()
+    if depth == 1: # no need to make the last moves just to count them
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        gs.makeMove(move)
+        nodes += perft(gs, depth - 1)
+        gs.undoMove()
+    return nodes
+
+def divide(gs, depth):
+    '''Perft split by root move, [(move, nodes)]. Comparing it with another engine shows which move is wrong'''
+    results = []
+    for move in gs.getValidMoves():
+        gs.makeMove(move)
+        results.append((move, perft(gs, depth - 1)))
+        gs.undoMove()
+    return results
+
+def runSuite(gameStateClass, depth=DEFAULT_DEPTH):
+    '''Perft every position of PERFT_POSITIONS (at most as deep as its known counts go) and report
+    the counts and nodes per second. Returns True if every count was right'''
+    allCorrect = True
+    totalNodes = 0
+    totalTime = 0
+    for name, fen, expectedCounts in PERFT_POSITIONS:
+        positionDepth = min(depth, len(expectedCounts))
+        gs = gameStateClass(fen)
+        start = time.perf_counter()
+        nodes = perft(gs, positionDepth)
+        elapsed = time.perf_counter() - start
+        correct = nodes == expectedCounts[positionDepth - 1]
+        allCorrect = allCorrect and correct
+        totalNodes += nodes
+        totalTime += elapsed
+        print("%-11s depth %d: %9d nodes, expected %9d %-4s %7.2fs %9.0f nps" % (name, positionDepth, nodes, expectedCounts[positionDepth - 1],
+              "ok" if correct else "FAIL", elapsed, nodes / elapsed))
+    print("total: %d nodes in %.2fs, %.0f nps" % (totalNodes, totalTime, totalNodes / totalTime))
+    return allCorrect
+
+def main():
+    parser = argparse.ArgumentParser(description="Check and time move generation with perft")
+    parser.add_argument("--mailbox", action="store_true", help="use the 8x8 board GameState instead of the BitboardGameState")
+    parser.add_argument("--depth", type=int, default=DEFAULT_DEPTH)
+    parser.add_argument("--fen", help="perft this position instead of the standard suite")
+    parser.add_argument("--divide", action="store_true", help="with --fen, print the node count of every root move")
+    args = parser.parse_args()
+    gameStateClass = ChessEngine.GameState if args.mailbox else ChessBitboard.BitboardGameState
+
+    if args.fen is None:
+        sys.exit(0 if runSuite(gameStateClass, args.depth) else 1)
+    gs = gameStateClass(args.fen)
+    start = time.perf_counter()
+    if args.divide:
+        results = divide(gs, args.depth)
+        for move, nodes in results:
+            print(move.getChessNotation() + ":", nodes)
+        nodes = sum(nodes for move, nodes in results)
+    else:
+        nodes = perft(gs, args.depth)
+    elapsed = time.perf_counter() - start
+    print("nodes:", nodes, "time: %.2fs" % elapsed, "nps: %.0f" % (nodes / elapsed))
+
+
+if __name__ == "__main__":
+    main()
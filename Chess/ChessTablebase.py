@@ -0,0 +1,96 @@
+'''
+Endgame tablebases: exact win/draw/loss results for positions with few pieces, read from Syzygy files. The files are
+memory-mapped by python-chess, which is only needed when tablebases are used. Without it, or without any files,
+probing is simply switched off.
+'''
+
+import os
+
+try:
+    import chess
+    import chess.syzygy
+except ImportError:
+    chess = None
+
+TABLEBASE_PIECES = 5 # never probe positions with more pieces than this, even if bigger tables are there
+TABLEBASE_WIN = 500 # score of a tablebase win, below CHECKMATE so a mate found by the search still counts for more
+
+
+def openTablebase(directory):
+    '''A Tablebase for the directory, or None when python-chess isn't installed or there is no such directory'''
+    if chess is None or not os.path.isdir(directory):
+        return None
+    return Tablebase(directory)
+
+def countPieces(gs):
+    return 64 - sum(row.count("--") for row in gs.board)
+
+
+class Tablebase():
+    def __init__(self, directory, maxPieces=TABLEBASE_PIECES):
+        '''Open the Syzygy files (*.rtbw for win/draw/loss, *.rtbz for distance to zeroing) in directory'''
+        if chess is None:
+            raise ImportError("python-chess is needed for tablebase probing")
+        self.tablebase = chess.syzygy.open_tablebase(directory)
+        # largest table found, a name like KRPvKR has one letter per piece
+        tableSizes = [len(name) - len(".rtbw") - 1 for name in os.listdir(directory) if name.endswith(".rtbw")]
+        self.maxPieces = min(max(tableSizes, default=0), maxPieces)
+
+    def close(self):
+        self.tablebase.close()
+
+    def canProbe(self, gs):
+        '''Tables only cover positions without castling rights and up to maxPieces pieces'''
+        return gs.castlingRights == 0 and countPieces(gs) <= self.maxPieces
+
+    def probeWDL(self, gs):
+        '''2 if the side to move wins, 0 for a draw, -2 if it loses, 1/-1 for a win/loss that the fifty-move rule turns
+        into a draw. None if the position isn't in the tables'''
+        if not self.canProbe(gs):
+            return None
+        try:
+            return self.tablebase.probe_wdl(chess.Board(gs.getFEN()))
+        except KeyError: # table file missing
+            return None
+
+    def probeScore(self, gs):
+        '''Search score of the position for the side to move, None if it isn't in the tables'''
+        wdl = self.probeWDL(gs)
+        if wdl is None:
+            return None
+        if wdl == 2:
+            return TABLEBASE_WIN
+        if wdl == -2:
+            return -TABLEBASE_WIN
+        return 0
+
+    def getRootMove(self, gs, validMoves):
+        '''(move, score) of the move that keeps the best result and makes progress towards it: a mate, else the
+        smallest distance to zeroing when winning and the largest when losing. None if the tables don't cover the position'''
+        if not self.canProbe(gs):
+            return None
+        rankedMoves = []
+        for move in validMoves:
+            gs.makeMove(move)
+            try:
+                if len(gs.getValidMoves()) == 0 and gs.checkMate:
+                    rank = (3, 0)
+                else:
+                    board = chess.Board(gs.getFEN())
+                    wdl = -self.tablebase.probe_wdl(board)
+                    dtz = -self.tablebase.probe_dtz(board) # plies to the next capture or pawn move, from our side
+                    zeroing = move.isCapture or move.pieceMoved[1] == 'p'
+                    if wdl > 0: # win, zero the clock at once or get there fast
+                        rank = (wdl, 1 if zeroing else 0, -abs(dtz))
+                    else: # draw or loss, hold out as long as possible
+                        rank = (wdl, 0, abs(dtz))
+            except KeyError:
+                return None
+            finally:
+                gs.undoMove()
+            rankedMoves.append((rank, move))
+        if len(rankedMoves) == 0:
+            return None
+        rank, move = max(rankedMoves, key=lambda rankedMove: rankedMove[0])
+        wdl = 2 if rank[0] == 3 else rank[0]
+        return move, TABLEBASE_WIN if wdl == 2 else -TABLEBASE_WIN if wdl == -2 else 0
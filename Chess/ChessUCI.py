@@ -0,0 +1,226 @@
+'''
+UCI front end: plays the engine through the Universal Chess Interface on stdin/stdout, without pygame or a display,
+so GUIs and match servers can run it. The search runs on its own thread so "stop" and "ponderhit" are handled while
+it thinks.
+Usage: python Chess/ChessUCI.py
+'''
+
+import sqlite3
+import sys
+import threading
+import time
+import ChessAI, ChessBitboard, ChessBook, ChessCache, ChessTablebase
+
+ENGINE_NAME = "Chess-Engine"
+ENGINE_AUTHOR = "xinbocc"
+MOVES_TO_GO = 30 # share of the clock used for one move when the GUI doesn't say how many moves are left
+MOVE_OVERHEAD = 0.05 # seconds kept back for sending the move
+
+
+class SearchInfo():
+    '''Stands in for the return queue of ChessAI.Searcher.search and writes every finished depth as an info line'''
+    def __init__(self, engine, startTime):
+        self.engine = engine
+        self.startTime = startTime
+
+    def put(self, result):
+        depth, score, pv, nodes = result
+        if depth == 0: # the search was stopped before depth 1 finished
+            return
+        elapsed = max(time.time() - self.startTime, 0.001)
+        centipawns, mate = ChessAI.reportedScore(score)
+        scoreText = "mate %d" % mate if mate is not None else "cp %d" % centipawns
+        self.engine.send("info depth %d score %s nodes %d time %d nps %d pv %s" % (depth, scoreText, nodes, elapsed * 1000,
+                         nodes / elapsed, " ".join(move.getChessNotation() for move in pv)))
+
+
+class UCIEngine():
+    def __init__(self, output=sys.stdout):
+        self.output = output
+        self.outputLock = threading.Lock() # info lines come from the search thread
+        self.gs = ChessBitboard.BitboardGameState()
+        self.searcher = ChessAI.Searcher(ChessAI.openingBook, ChessAI.tablebase) # keeps its tables from one move to the next
+        self.searchThread = None
+        self.stopEvent = threading.Event()
+        self.ponderHitEvent = None # set on "ponderhit" while a "go ponder" search runs
+        self.searchStats = False # report ChessAI.SearchStats after every search
+
+    def send(self, line):
+        with self.outputLock:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    def run(self, input=sys.stdin):
+        '''Read commands until "quit" or the end of the input'''
+        for line in input:
+            if not self.handleCommand(line):
+                break
+        self.stopSearch()
+
+    def handleCommand(self, line):
+        '''Carry out one line of input. Returns False on "quit"'''
+        tokens = line.split()
+        if len(tokens) == 0:
+            return True
+        command = tokens[0]
+        if command == "uci":
+            self.send("id name " + ENGINE_NAME)
+            self.send("id author " + ENGINE_AUTHOR)
+            self.send("option name BookFile type string default " + (ChessAI.BOOK_FILE if self.searcher.openingBook is not None else "<empty>"))
+            self.send("option name SyzygyPath type string default " + (ChessAI.TABLEBASE_DIRECTORY if self.searcher.tablebase is not None else "<empty>"))
+            self.send("option name AnalysisCache type string default <empty>")
+            self.send("option name Ponder type check default true")
+            self.send("option name SearchStats type check default false")
+            self.send("uciok")
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "setoption":
+            self.stopSearch()
+            self.setOption(tokens[1:])
+        elif command == "ucinewgame":
+            self.stopSearch()
+            self.searcher.newGame()
+        elif command == "position":
+            self.stopSearch()
+            self.setPosition(tokens[1:])
+        elif command == "go":
+            self.stopSearch()
+            self.startSearch(tokens[1:])
+        elif command == "ponderhit":
+            if self.ponderHitEvent is not None:
+                self.ponderHitEvent.set()
+        elif command == "stop":
+            self.stopSearch()
+        elif command == "quit":
+            return False
+        # anything else is ignored, as the protocol asks
+        return True
+
+    def setOption(self, tokens):
+        '''setoption name <id> [value <x>]'''
+        valueAt = tokens.index("value") if "value" in tokens else len(tokens)
+        name = " ".join(tokens[1:valueAt])
+        value = " ".join(tokens[valueAt + 1:])
+        if name == "BookFile":
+            if self.searcher.openingBook is not None:
+                self.searcher.openingBook.close()
+                self.searcher.openingBook = None
+            if value not in ("", "<empty>"):
+                try:
+                    self.searcher.openingBook = ChessBook.OpeningBook(value)
+                except OSError as e:
+                    self.send("info string can't open book: " + str(e))
+        elif name == "AnalysisCache":
+            if self.searcher.analysisCache is not None:
+                self.searcher.analysisCache.close()
+                self.searcher.analysisCache = None
+            if value not in ("", "<empty>"):
+                try:
+                    self.searcher.analysisCache = ChessCache.AnalysisCache(value)
+                except sqlite3.Error as e:
+                    self.send("info string can't open analysis cache: " + str(e))
+        elif name == "SearchStats":
+            self.searchStats = value == "true"
+        elif name == "SyzygyPath":
+            if self.searcher.tablebase is not None:
+                self.searcher.tablebase.close()
+            self.searcher.tablebase = None
+            if value not in ("", "<empty>"):
+                self.searcher.tablebase = ChessTablebase.openTablebase(value)
+                if self.searcher.tablebase is None:
+                    self.send("info string no tablebases: python-chess is missing or " + value + " isn't a directory")
+
+    def setPosition(self, tokens):
+        '''position [startpos | fen <fen>] [moves <move1> ... <movei>]'''
+        movesAt = tokens.index("moves") if "moves" in tokens else len(tokens)
+        try:
+            if len(tokens) > 0 and tokens[0] == "fen":
+                self.gs = ChessBitboard.BitboardGameState(" ".join(tokens[1:movesAt]))
+            else:
+                self.gs = ChessBitboard.BitboardGameState()
+        except ValueError as e:
+            self.send("info string " + str(e))
+            return
+        for notation in tokens[movesAt + 1:]:
+            move = self.findMove(notation)
+            if move is None:
+                self.send("info string illegal move " + notation)
+                return
+            self.gs.makeMove(move)
+
+    def findMove(self, notation):
+        '''The valid move with the long algebraic notation (e2e4, e7e8q) or None'''
+        for move in self.gs.getValidMoves():
+            if move.getChessNotation() == notation:
+                return move
+        return None
+
+    def startSearch(self, tokens):
+        '''go [ponder] [depth N] [nodes N] [movetime MS] [wtime MS btime MS winc MS binc MS movestogo N] [infinite]
+        With ponder the position ends with the move we expect the opponent to play. The search runs without a clock
+        until "ponderhit" says that move was played, then the time limit starts; on a miss the GUI sends "stop"'''
+        options = {}
+        for i, token in enumerate(tokens):
+            if i + 1 < len(tokens) and tokens[i + 1].lstrip("-").isdigit():
+                options[token] = int(tokens[i + 1])
+        infinite = "infinite" in tokens or len(options) == 0
+        maxDepth = min(options.get("depth", ChessAI.MAX_DEPTH), ChessAI.MAX_DEPTH)
+        nodeLimit = options.get("nodes")
+        timeLimit = None
+        if "movetime" in options:
+            timeLimit = options["movetime"] / 1000
+        elif ("wtime" if self.gs.whiteToMove else "btime") in options:
+            timeLeft = options["wtime" if self.gs.whiteToMove else "btime"] / 1000
+            increment = options.get("winc" if self.gs.whiteToMove else "binc", 0) / 1000
+            timeLimit = timeLeft / options.get("movestogo", MOVES_TO_GO) + increment / 2
+            timeLimit = max(min(timeLimit, timeLeft - MOVE_OVERHEAD), 0.01)
+        if infinite:
+            timeLimit = None
+        self.stopEvent = threading.Event()
+        self.ponderHitEvent = threading.Event() if "ponder" in tokens else None
+        self.searchThread = threading.Thread(target=self.search, args=(self.gs, timeLimit, nodeLimit, maxDepth, infinite, self.stopEvent,
+                                             self.ponderHitEvent), daemon=True)
+        self.searchThread.start()
+
+    def search(self, gs, timeLimit, nodeLimit, maxDepth, infinite, stopEvent, ponderHitEvent):
+        '''Body of the search thread, ends with the bestmove line'''
+        validMoves = gs.getValidMoves()
+        if len(validMoves) == 0: # mate or stalemate, nothing to search, but the GUI still decides when to answer
+            self.waitForBestMove(infinite, stopEvent, ponderHitEvent)
+            self.send("bestmove 0000")
+            return
+        stats = ChessAI.SearchStats() if self.searchStats else None
+        info = SearchInfo(self, time.time())
+        result = self.searcher.search(gs, validMoves, info, timeLimit, nodeLimit, maxDepth, stopEvent, stats, ponderHitEvent)
+        if stats is not None:
+            for line in stats.report():
+                self.send("info string " + line)
+        self.waitForBestMove(infinite, stopEvent, ponderHitEvent)
+        if len(result.pv) >= 2: # the reply we expect, to ponder on
+            self.send("bestmove %s ponder %s" % (result.bestMove.getChessNotation(), result.pv[1].getChessNotation()))
+        else:
+            self.send("bestmove " + result.bestMove.getChessNotation())
+
+    def waitForBestMove(self, infinite, stopEvent, ponderHitEvent):
+        '''The move may only be sent once the GUI says stop, or ponderhit when pondering'''
+        if infinite:
+            stopEvent.wait()
+        elif ponderHitEvent is not None:
+            ponderHitEvent.wait() # stopSearch sets it too
+
+    def stopSearch(self):
+        '''Stop the running search, if any, and wait for its bestmove'''
+        if self.searchThread is not None:
+            self.stopEvent.set()
+            if self.ponderHitEvent is not None:
+                self.ponderHitEvent.set()
+            self.searchThread.join()
+            self.searchThread = None
+
+
+def main():
+    UCIEngine().run()
+
+
+if __name__ == "__main__":
+    main()
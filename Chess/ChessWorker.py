@@ -0,0 +1,133 @@
+'''
+Engine worker: one search process that lives as long as the game, instead of a new process for every AI move.
+It keeps its Searcher, and with it the transposition table and move ordering, from one move to the next, and so do
+the processes of its root search pool when it has more than one worker. A search request, to the worker as well as to
+each pool process, only carries the start FEN and the moves played since, as long algebraic notation; they take back
+and make moves on their own copy of the position to catch up, which usually means one or two moves. Searches are
+stopped by setting an event that the search looks at between nodes, so the process is never killed mid-move.
+'''
+
+import queue
+import signal
+import sys
+from multiprocessing import Event, Process, Queue
+import ChessAI, ChessBitboard
+
+STOP_POLL_INTERVAL = 1 # seconds between two checks that the worker is still alive while waiting for it to stop
+
+
+class SearchResults():
+    '''Stands in for the return queue of ChessAI.Searcher.search and tags every result with the id of its search'''
+    def __init__(self, results, searchId):
+        self.results = results
+        self.searchId = searchId
+
+    def put(self, result):
+        self.results.put((self.searchId, result))
+
+
+class EngineWorker():
+    '''The GUI side of the worker process. Results come back as (searchId, (depth, score, pv, nodes)) with
+    (searchId, None) once a search is over; results of an older search than the current one are dropped'''
+    def __init__(self, workers=1):
+        '''With more than one worker the root moves of every search are shared out to a pool of that many processes
+        (ChessAI.Searcher.searchParallel) that lives as long as the worker process, with one it searches alone.
+        Either way the tables are kept from move to move'''
+        self.commands = Queue()
+        self.results = Queue()
+        self.stopEvent = Event()
+        self.ponderHitEvent = Event()
+        # not a daemon, those can't start a pool; close ends it
+        self.process = Process(target=runWorker, args=(self.commands, self.results, self.stopEvent, self.ponderHitEvent, workers))
+        self.process.start()
+        self.searchId = 0
+        self.searching = False # a search was started and the end of it hasn't been read yet
+
+    def search(self, gs, timeLimit=ChessAI.TIME_LIMIT, ponder=False):
+        '''Start a search of gs, after stopping the one running. With ponder the search has no time limit until
+        ponderHit, then timeLimit starts'''
+        self.stop()
+        self.stopEvent.clear()
+        self.ponderHitEvent.clear()
+        self.searchId += 1
+        self.commands.put(("go", self.searchId, gs.startFEN, [move.getChessNotation() for move in gs.moveLog], timeLimit, ponder))
+        self.searching = True
+
+    def getResults(self):
+        '''(results, finished): the (depth, score, pv, nodes) of every depth the search finished since the last call,
+        and whether the search is over. Doesn't wait'''
+        results = []
+        while self.searching:
+            try:
+                searchId, result = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if searchId != self.searchId: # left over from a stopped search
+                continue
+            if result is None:
+                self.searching = False
+            else:
+                results.append(result)
+        return results, not self.searching
+
+    def ponderHit(self):
+        '''The expected move was played, the pondering search becomes the real one'''
+        self.ponderHitEvent.set()
+
+    def stop(self):
+        '''Tell the running search to stop and wait until it has, which takes no longer than LIMIT_CHECK_INTERVAL
+        nodes. What it found is dropped'''
+        if not self.searching:
+            return
+        self.stopEvent.set()
+        while self.searching:
+            try:
+                searchId, result = self.results.get(timeout=STOP_POLL_INTERVAL)
+            except queue.Empty:
+                if not self.process.is_alive():
+                    self.searching = False
+                continue
+            if searchId == self.searchId and result is None:
+                self.searching = False
+
+    def newGame(self):
+        '''Stop searching and forget what was learned in the last game'''
+        self.stop()
+        self.commands.put(("newgame",))
+
+    def close(self):
+        self.stop()
+        self.commands.put(("quit",))
+        self.process.join(STOP_POLL_INTERVAL)
+        if self.process.is_alive():
+            self.process.terminate()
+
+
+def runWorker(commands, results, stopEvent, ponderHitEvent, workers=1):
+    '''Body of the worker process: carry out commands until "quit". A search runs to the end, its time limit or
+    stopEvent, and is always followed by (searchId, None) on results'''
+    searcher = ChessAI.Searcher(ChessAI.openingBook, ChessAI.tablebase)
+    # started once, so the pool workers keep their tables from move to move as well
+    pool = ChessAI.RootPool(workers, ChessAI.tablebase is not None, stopEvent, ponderHitEvent) if workers > 1 else None
+    signal.signal(signal.SIGTERM, lambda signalNumber, frame: sys.exit(0)) # terminate() ends the pool workers too
+    gs = None
+    playedMoves = [] # notation of the moves made on gs since its start FEN
+    try:
+        while True:
+            command = commands.get()
+            if command[0] == "quit":
+                break
+            if command[0] == "newgame":
+                searcher.newGame()
+                if pool is not None:
+                    pool.newGame()
+                continue
+            searchId, startFEN, moves, timeLimit, ponder = command[1:]
+            gs, playedMoves = ChessAI.followMoves(gs, playedMoves, startFEN, moves, ChessBitboard.BitboardGameState)
+            if gs is not None:
+                searcher.searchParallel(gs, None, SearchResults(results, searchId), workers, timeLimit, stopEvent=stopEvent,
+                                        ponderHitEvent=ponderHitEvent if ponder else None, pool=pool)
+            results.put((searchId, None))
+    finally:
+        if pool is not None:
+            pool.close()
@@ -0,0 +1,38 @@
+import io
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Chess"))
+import ChessAnalysis
+
+
+class ReadPGNTest(unittest.TestCase):
+    def readFENs(self, pgn):
+        return [fen for positionId, fen in ChessAnalysis.readPGN(io.StringIO(pgn))]
+
+    def testPlainGame(self):
+        self.assertEqual(len(self.readFENs("1. e4 e5\n2. Nf3 Nc6 3. Bb5 a6 *\n")), 6)
+
+    def testSemicolonCommentEndsAtLineEnd(self):
+        plain = self.readFENs("1. e4 e5\n2. Nf3 Nc6 3. Bb5 a6 *\n")
+        commented = self.readFENs("1. e4 e5 ; a comment\n2. Nf3 Nc6 3. Bb5 a6 *\n")
+        self.assertEqual(commented, plain)
+
+    def testNestedVariationAndComments(self):
+        plain = self.readFENs("1. e4 e5\n2. Nf3 Nc6 3. Bb5 a6 *\n")
+        annotated = self.readFENs("1. e4 {best by test} e5 (1... c5 2. Nf3 (2. c3 d5) d6 ; Sicilian\n) 2. Nf3 $1 Nc6\n"
+                                  "3. Bb5 ({or} 3. Bc4 Bc5) a6 *\n")
+        self.assertEqual(annotated, plain)
+
+    def testUnclosedVariationEndsTheGame(self):
+        self.assertEqual(len(self.readFENs("1. e4 e5 2. Nf3 (2. Nc3 *\n")), 3)
+
+    def testGamesAreSplitByTags(self):
+        pgn = '[Event "one"]\n\n1. e4 ; comment\n*\n\n[Event "two"]\n\n1. d4 d5 *\n'
+        ids = [positionId for positionId, fen in ChessAnalysis.readPGN(io.StringIO(pgn))]
+        self.assertEqual(ids, ["1.1", "2.1", "2.2"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,25 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Chess"))
+import ChessBitboard
+import ChessEngine
+
+
+class LoadFENTest(unittest.TestCase):
+    def testCastlingRightNeedsKingAndRookAtHome(self):
+        for gameStateClass in (ChessEngine.GameState, ChessBitboard.BitboardGameState):
+            gs = gameStateClass("4k3/8/8/8/8/8/8/4K3 w KQ - 0 1")
+            self.assertNotIn("e1g1", [move.getChessNotation() for move in gs.getValidMoves()])
+            self.assertEqual(gameStateClass("r3k3/8/8/8/8/8/8/4K2R w KQkq - 0 1").getFEN(), "r3k3/8/8/8/8/8/8/4K2R w Kq - 0 1")
+            self.assertEqual(gameStateClass("r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1").getFEN(), "r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1")
+
+    def testSideNotToMoveInCheckIsRejected(self):
+        with self.assertRaises(ValueError):
+            ChessEngine.GameState("7k/8/8/8/8/8/8/K6R w - - 0 1")
+        ChessEngine.GameState("7k/8/8/8/8/8/8/K6R b - - 0 1") # the side to move may be in check
+
+
+if __name__ == "__main__":
+    unittest.main()